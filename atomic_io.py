@@ -0,0 +1,29 @@
+# praga/atomic_io.py
+
+import os
+import tempfile
+
+
+def write_atomic(path, text):
+    """
+    Replaces `path` with `text` in one step, so readers never see a partial
+    file. Each writer gets its own temporary file, so concurrent writers
+    (threads or processes) cannot write into each other's; the temporary
+    file is removed if the write fails.
+    """
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory or ".", prefix=f"{os.path.basename(path)}.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            # mkstemp creates the file private; keep it readable by scrapers such as node_exporter.
+            os.fchmod(f.fileno(), 0o644)
+            f.write(text)
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
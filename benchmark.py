@@ -0,0 +1,161 @@
+# praga/benchmark.py
+"""
+End-to-end latency benchmark for the page code paths, run offline against
+the mock AI provider.
+
+Each scenario drives the real Streamlit pages headlessly through
+streamlit.testing.v1.AppTest with a synthetic knowledge base loaded, and
+times the rerun that performs the AI work. Simulated users run concurrently,
+each in its own process.
+
+Example:
+    python benchmark.py --users 4 --iterations 5 --latency-median 0.5 --failure-rate 0.1
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import statistics
+import sys
+import time
+
+SCENARIOS = ("chat", "quiz", "analysis")
+MAIN_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "main.py")
+
+
+def build_corpus(num_files, paragraphs_per_file):
+    """Returns a synthetic processed_data dict of the requested size."""
+    paragraph = (
+        "Bresenham's algorithm draws line segments using only integer arithmetic. "
+        "Homogeneous coordinates allow translation, scaling and rotation to be composed as matrices. "
+    )
+    return {
+        f"course/lecture_{i:03d}.pdf": "\n\n".join(f"{i}.{p} {paragraph}" for p in range(paragraphs_per_file))
+        for i in range(num_files)
+    }
+
+
+def _open_page(corpus, menu_label, timeout):
+    from streamlit.testing.v1 import AppTest
+
+    at = AppTest.from_file(MAIN_SCRIPT, default_timeout=timeout)
+    at.session_state["processed_data"] = corpus
+    at.run()
+    at.sidebar.radio[0].set_value(menu_label).run()
+    return at
+
+
+def run_chat(at, iteration):
+    at.chat_input[0].set_value(f"Question {iteration}: how does Bresenham's algorithm work?").run()
+
+
+def run_quiz(at, iteration):
+    at.text_input(key="quiz_topic").set_value(f"Geometric transformations #{iteration}")
+    at.button(key="generate_quiz_button").click().run()
+
+
+def run_analysis(at, iteration):
+    at.button(key="analyze_materials_button").click().run()
+
+
+SCENARIO_SETUP = {
+    "chat": ("💬 AI Chat Based on Materials", run_chat),
+    "quiz": ("❓ Quiz Generator", run_quiz),
+    "analysis": ("📊 Didactic Analysis vs. Competencies", run_analysis),
+}
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    if not ordered:
+        return float("nan")
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def _user_loop(name, corpus, iterations, timeout, user_id):
+    """Runs one simulated user's operations and returns (latencies, error_latencies)."""
+    menu_label, operation = SCENARIO_SETUP[name]
+    latencies, errors = [], []
+    at = _open_page(corpus, menu_label, timeout)
+    for iteration in range(iterations):
+        started = time.perf_counter()
+        try:
+            operation(at, user_id * iterations + iteration)
+            failed = bool(at.exception)
+        except Exception as e:
+            failed = True
+            print(f"[{name}] user {user_id}: {e}", file=sys.stderr)
+        elapsed = time.perf_counter() - started
+        (errors if failed else latencies).append(elapsed)
+    return latencies, errors
+
+
+def run_scenario(name, corpus, users, iterations, timeout):
+    """
+    Runs `iterations` operations per simulated user and returns
+    (latencies, error_latencies, wall_time). AppTest keeps a process-wide
+    runtime, so each simulated user runs in its own process.
+    """
+    started = time.perf_counter()
+    with multiprocessing.Pool(processes=users) as pool:
+        per_user = pool.starmap(_user_loop, [(name, corpus, iterations, timeout, u) for u in range(users)])
+    wall_time = time.perf_counter() - started
+    latencies = [x for user_latencies, _ in per_user for x in user_latencies]
+    errors = [x for _, user_errors in per_user for x in user_errors]
+    return latencies, errors, wall_time
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the page code paths against the mock AI provider.")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS), help="Comma-separated subset of: " + ", ".join(SCENARIOS))
+    parser.add_argument("--users", type=int, default=2, help="Concurrent simulated users per scenario.")
+    parser.add_argument("--iterations", type=int, default=3, help="Operations per user.")
+    parser.add_argument("--files", type=int, default=20, help="Files in the synthetic knowledge base.")
+    parser.add_argument("--paragraphs", type=int, default=30, help="Paragraphs per synthetic file.")
+    parser.add_argument("--latency-median", type=float, default=0.3, help="Mock time-to-first-token median (s).")
+    parser.add_argument("--latency-sigma", type=float, default=0.5, help="Log-normal sigma of the mock latency.")
+    parser.add_argument("--failure-rate", type=float, default=0.0)
+    parser.add_argument("--empty-rate", type=float, default=0.0)
+    parser.add_argument("--tokens-per-second", type=float, default=400.0)
+    parser.add_argument("--cache", action="store_true", help="Keep the AI response cache enabled.")
+    parser.add_argument("--timeout", type=float, default=600.0, help="Per-rerun AppTest timeout (s).")
+    parser.add_argument("--json", dest="json_path", help="Also write the results to this JSON file.")
+    args = parser.parse_args()
+
+    # The provider is chosen when utils is imported by the app script, so configure it first.
+    os.environ["EDU_AI_PROVIDER"] = "mock"
+    os.environ["EDU_AI_CACHE"] = "on" if args.cache else "off"
+    os.environ["MOCK_AI_CONFIG"] = json.dumps({
+        "latency_median": args.latency_median,
+        "latency_sigma": args.latency_sigma,
+        "failure_rate": args.failure_rate,
+        "empty_rate": args.empty_rate,
+        "tokens_per_second": args.tokens_per_second,
+    })
+
+    corpus = build_corpus(args.files, args.paragraphs)
+    results = {}
+    print(f"{'scenario':<10} {'ok':>4} {'err':>4} {'p50 (s)':>9} {'p95 (s)':>9} {'p99 (s)':>9} {'ops/s':>7}")
+    for name in [s.strip() for s in args.scenarios.split(",") if s.strip()]:
+        latencies, errors, wall_time = run_scenario(name, corpus, args.users, args.iterations, args.timeout)
+        results[name] = {
+            "ok": len(latencies),
+            "errors": len(errors),
+            "p50": percentile(latencies, 50),
+            "p95": percentile(latencies, 95),
+            "p99": percentile(latencies, 99),
+            "mean": statistics.fmean(latencies) if latencies else float("nan"),
+            "throughput_ops_per_s": (len(latencies) + len(errors)) / wall_time if wall_time else 0.0,
+        }
+        r = results[name]
+        print(f"{name:<10} {r['ok']:>4} {r['errors']:>4} {r['p50']:>9.3f} {r['p95']:>9.3f} {r['p99']:>9.3f} {r['throughput_ops_per_s']:>7.2f}")
+
+    if args.json_path:
+        with open(args.json_path, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+# praga/benchmark_extraction.py
+"""
+Compares the PDF text backends on a sample corpus: throughput in pages per
+second and how closely each backend's output matches the reference backend
+(pdfplumber), word for word.
+
+Example:
+    python benchmark_extraction.py materials/ --repeat 3 --json extraction.json
+"""
+
+import argparse
+import difflib
+import json
+import os
+import sys
+import time
+
+from data_extractor import PDF_BACKENDS, iter_pdf_pages
+
+REFERENCE_BACKEND = "pdfplumber"
+
+
+def find_pdfs(paths):
+    """Expands files and folders into a sorted list of PDF paths."""
+    pdfs = []
+    for path in paths:
+        if os.path.isdir(path):
+            for dirpath, _, files in os.walk(path):
+                pdfs.extend(os.path.join(dirpath, f) for f in files if f.lower().endswith(".pdf"))
+        elif path.lower().endswith(".pdf"):
+            pdfs.append(path)
+    return sorted(pdfs)
+
+
+def extract_pages(path, backend):
+    """Returns (page_texts, seconds) for one PDF."""
+    started = time.perf_counter()
+    pages = [text for _, text in iter_pdf_pages(path, backend)]
+    return pages, time.perf_counter() - started
+
+
+def word_similarity(reference, candidate):
+    """Similarity of the two texts' word sequences, from 0 to 1."""
+    ref_words, cand_words = reference.split(), candidate.split()
+    if ref_words == cand_words:
+        return 1.0
+    return difflib.SequenceMatcher(None, ref_words, cand_words, autojunk=False).ratio()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the PDF text extraction backends.")
+    parser.add_argument("paths", nargs="+", help="PDF files or folders containing them.")
+    parser.add_argument("--backends", default=",".join(PDF_BACKENDS), help="Comma-separated subset of: " + ", ".join(PDF_BACKENDS))
+    parser.add_argument("--repeat", type=int, default=1, help="Timed runs per file and backend; the fastest is kept.")
+    parser.add_argument("--json", dest="json_path", help="Also write the results to this JSON file.")
+    args = parser.parse_args()
+
+    pdfs = find_pdfs(args.paths)
+    if not pdfs:
+        print("No PDF files found.", file=sys.stderr)
+        sys.exit(1)
+    backends = [b.strip() for b in args.backends.split(",") if b.strip()]
+
+    outputs = {backend: {} for backend in backends}
+    results = {backend: {"pages": 0, "seconds": 0.0, "failed": []} for backend in backends}
+    for path in pdfs:
+        for backend in backends:
+            try:
+                best = None
+                for _ in range(max(1, args.repeat)):
+                    pages, seconds = extract_pages(path, backend)
+                    best = seconds if best is None else min(best, seconds)
+            except Exception as e:
+                print(f"[{backend}] {path}: {e}", file=sys.stderr)
+                results[backend]["failed"].append(path)
+                continue
+            outputs[backend][path] = pages
+            results[backend]["pages"] += len(pages)
+            results[backend]["seconds"] += best
+
+    reference = outputs.get(REFERENCE_BACKEND, {})
+    print(f"{'backend':<12} {'files':>5} {'pages':>6} {'seconds':>9} {'pages/s':>9} {'similarity':>10} {'identical pages':>16}")
+    for backend in backends:
+        r = results[backend]
+        r["pages_per_second"] = r["pages"] / r["seconds"] if r["seconds"] else 0.0
+        scores, identical, compared = [], 0, 0
+        for path, pages in outputs[backend].items():
+            if path not in reference:
+                continue
+            scores.append(word_similarity("\n".join(reference[path]), "\n".join(pages)))
+            for ref_page, page in zip(reference[path], pages):
+                compared += 1
+                identical += ref_page.split() == page.split()
+        r["similarity"] = sum(scores) / len(scores) if scores else None
+        r["identical_pages"] = f"{identical}/{compared}" if compared else None
+        similarity = f"{r['similarity']:.4f}" if r["similarity"] is not None else "n/a"
+        print(
+            f"{backend:<12} {len(outputs[backend]):>5} {r['pages']:>6} {r['seconds']:>9.2f} "
+            f"{r['pages_per_second']:>9.1f} {similarity:>10} {r['identical_pages'] or 'n/a':>16}"
+        )
+
+    if args.json_path:
+        with open(args.json_path, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+# praga/context_packer.py
+
+import re
+
+# Rough characters-per-token ratio; kept low so estimates err on the safe side
+# for Romanian text and code snippets, which tokenize worse than English prose.
+CHARS_PER_TOKEN = 3.5
+
+# Context windows in tokens, keyed by model id. The router works with provider
+# names and g4f model names, which utils.context_model_name resolves to these
+# ids first. Anything left unmatched (providers whose default model is not
+# listed, g4f's model classes, the mock models) gets the default, which is kept
+# small enough for the free providers in use.
+DEFAULT_CONTEXT_TOKENS = 16000
+MODEL_CONTEXT_TOKENS = {
+    "gpt-4": 8192,
+    "gpt-3.5-turbo": 16385,
+    "gpt-4o": 128000,
+    "gpt-4o-mini": 128000,
+    "gpt-4.1": 128000,
+    "llama-3.1-70b": 128000,
+    "llama-3.3-70b": 128000,
+    "mixtral-8x7b": 32768,
+    "deepseek-v3": 64000,
+    "gemini-1.5-flash": 128000,
+}
+SAFETY_MARGIN_TOKENS = 500
+
+TRUNCATION_NOTE = "[CONTEXT TRUNCATED]"
+
+def estimate_tokens(text):
+    """Fast token estimate based on character count."""
+    if not text:
+        return 0
+    return int(len(text) / CHARS_PER_TOKEN) + 1
+
+def context_limit(model_names):
+    """
+    Returns the smallest context window among the given models, since any of
+    them may end up serving the request after a fallback.
+    """
+    limits = [MODEL_CONTEXT_TOKENS.get(name, DEFAULT_CONTEXT_TOKENS) for name in model_names or []]
+    return min(limits) if limits else DEFAULT_CONTEXT_TOKENS
+
+def context_budget(model_names, reserved_output_tokens, prompt_text=""):
+    """Returns how many tokens of material fit next to the prompt and the reserved output."""
+    budget = context_limit(model_names) - reserved_output_tokens - estimate_tokens(prompt_text) - SAFETY_MARGIN_TOKENS
+    return max(budget, 0)
+
+def _split_units(text):
+    """Splits text into its non-empty paragraphs."""
+    return [p for p in re.split(r"\n\s*\n", text) if p.strip()]
+
+def _fill(text, token_budget):
+    """Takes whole paragraphs (or, for long paragraphs, whole lines) in order until the budget is used."""
+    kept, used = [], 0
+    for paragraph in _split_units(text):
+        cost = estimate_tokens(paragraph)
+        if used + cost <= token_budget:
+            kept.append(paragraph)
+            used += cost
+            continue
+        lines = []
+        for line in paragraph.split("\n"):
+            line_cost = estimate_tokens(line)
+            if used + line_cost > token_budget:
+                break
+            lines.append(line)
+            used += line_cost
+        if lines:
+            kept.append("\n".join(lines))
+        break
+    return "\n\n".join(kept), used
+
+def pack_text(text, token_budget):
+    """
+    Returns `text` cut to `token_budget` at paragraph or line boundaries,
+    followed by TRUNCATION_NOTE if anything was left out.
+    """
+    if estimate_tokens(text) <= token_budget:
+        return text
+    packed, _ = _fill(text, token_budget - estimate_tokens(TRUNCATION_NOTE))
+    return f"{packed}\n\n{TRUNCATION_NOTE}"
+
+def pack_sections(sections, token_budget, separator="\n\n"):
+    """
+    Greedily packs (header, text) sections into `token_budget`. Sections that
+    fit are kept whole; a section that does not fit contributes the paragraphs
+    that still fit, and packing continues with the next (possibly smaller)
+    sections. Returns (packed_text, truncated).
+    """
+    parts, used, truncated = [], 0, False
+    separator_cost = estimate_tokens(separator)
+    for header, text in sections:
+        block = f"{header}\n{text}"
+        cost = estimate_tokens(block) + separator_cost
+        if used + cost <= token_budget:
+            parts.append(block)
+            used += cost
+            continue
+        truncated = True
+        room = token_budget - used - separator_cost - estimate_tokens(header) - estimate_tokens(TRUNCATION_NOTE)
+        if room <= 0:
+            continue
+        partial, partial_cost = _fill(text, room)
+        if partial:
+            parts.append(f"{header}\n{partial}\n{TRUNCATION_NOTE}")
+            used += estimate_tokens(header) + partial_cost + estimate_tokens(TRUNCATION_NOTE) + separator_cost
+    return separator.join(parts), truncated
@@ -2,112 +2,572 @@
 
 import os
 import json
+import multiprocessing
+import multiprocessing.connection
+import time
+from io import BytesIO
 from docx import Document
 import pdfplumber
+import pypdfium2 as pdfium
 from pptx import Presentation
 import streamlit as st
+from atomic_io import write_atomic
+from extraction_cache import ExtractionCache, content_hash, make_extraction_key
+from kb_store import KnowledgeBaseStore
+from documents import markdown_headings
+
+SUPPORTED_EXTENSIONS = {".docx", ".pdf", ".pptx", ".txt", ".md"}
+
+# Parallel extraction settings: each file is parsed in its own worker process
+# so a crashing or hanging file cannot take the others down with it.
+EXTRACTION_MAX_WORKERS = max(1, (os.cpu_count() or 2) - 1)
+EXTRACTION_TIMEOUT_SECONDS = 300
+
+# Bump whenever a parser changes its output so cached documents are not reused.
+EXTRACTOR_VERSION = 2
+EXTRACTION_CACHE_ENABLED = os.environ.get("EDU_EXTRACTION_CACHE", "on") != "off"
+EXTRACTION_CACHE_PATH = os.path.join("output", "extraction_cache.sqlite3")
+EXTRACTION_CACHE_MAX_DISK_BYTES = 500 * 1024 * 1024
+
+# PDF text engines: "pdfium" (the PDFium library behind pdfplumber's page
+# rendering) reads the text layer directly and is one to two orders of
+# magnitude faster; "pdfplumber" runs full layout analysis and reproduces
+# column and spacing order more faithfully on complex layouts.
+PDF_BACKENDS = ("pdfium", "pdfplumber")
+DEFAULT_PDF_BACKEND = os.environ.get("EDU_PDF_BACKEND", "pdfium")
+
+# --- Format-specific extraction (no Streamlit calls, safe in worker processes) ---
+
+def _as_source(source):
+    """pdfplumber, python-docx and python-pptx accept paths or file objects, but not raw bytes."""
+    return BytesIO(source) if isinstance(source, (bytes, bytearray)) else source
+
+# Every extractor returns a document record:
+#   {"text": str,
+#    "units": [[kind, number, start, end], ...],    # pages, slides or the whole document
+#    "headings": [[offset, level, title], ...]}
+# Offsets are character positions in "text", which is exactly the string
+# stored in processed_data, so a chunk can be cut out of it without copying.
+
+def _document(parts, units, headings):
+    return {"text": "".join(parts), "units": units, "headings": headings}
+
+def _iter_pdfplumber_pages(source):
+    with pdfplumber.open(_as_source(source)) as pdf:
+        for page in pdf.pages:
+            try:
+                yield page.page_number, page.extract_text() or ""
+            finally:
+                page.close()
+
+def _iter_pdfium_pages(source):
+    pdf = pdfium.PdfDocument(_as_source(source))
+    try:
+        for index in range(len(pdf)):
+            page = pdf[index]
+            textpage = page.get_textpage()
+            try:
+                text = textpage.get_text_range().replace("\r\n", "\n").replace("\r", "\n")
+            finally:
+                textpage.close()
+                page.close()
+            yield index + 1, text.strip()
+    finally:
+        pdf.close()
+
+_PDF_PAGE_ITERATORS = {
+    "pdfium": _iter_pdfium_pages,
+    "pdfplumber": _iter_pdfplumber_pages,
+}
+
+def iter_pdf_pages(source, backend=None):
+    """
+    Yields (page_number, text) for each page of a PDF, starting at 1, using
+    the given backend (see PDF_BACKENDS). Each page is released before the
+    next one is read, so memory stays flat however long the document is.
+    """
+    backend = backend or DEFAULT_PDF_BACKEND
+    if backend not in _PDF_PAGE_ITERATORS:
+        raise ValueError(f"Unknown PDF backend: {backend}")
+    return _PDF_PAGE_ITERATORS[backend](source)
+
+def iter_pptx_slides(source):
+    """Yields (slide_number, title, text) for each slide of a presentation, starting at 1."""
+    prs = Presentation(_as_source(source))
+    for number, slide in enumerate(prs.slides, start=1):
+        title_shape = slide.shapes.title
+        title = title_shape.text.strip() if title_shape is not None else ""
+        yield number, title, "".join(shape.text + "\n" for shape in slide.shapes if hasattr(shape, "text"))
+
+def _pdf_document(source, backend=None):
+    parts, units, offset = [], [], 0
+    for number, text in iter_pdf_pages(source, backend):
+        if not text:
+            continue
+        parts.append(text + "\n")
+        units.append(["page", number, offset, offset + len(text)])
+        offset += len(text) + 1
+    return _document(parts, units, [])
+
+def _pptx_document(source):
+    parts, units, headings, offset = [], [], [], 0
+    for number, title, text in iter_pptx_slides(source):
+        parts.append(text)
+        if text:
+            units.append(["slide", number, offset, offset + len(text)])
+            if title:
+                headings.append([offset, 1, title])
+        offset += len(text)
+    return _document(parts, units, headings)
+
+def _docx_document(source):
+    doc = Document(_as_source(source))
+    parts, headings, offset = [], [], 0
+    for i, para in enumerate(doc.paragraphs):
+        if i:
+            parts.append("\n")
+            offset += 1
+        style = para.style.name if para.style is not None else ""
+        if para.text.strip() and (style == "Title" or style.startswith("Heading")):
+            level = int(style.split()[-1]) if style.split()[-1].isdigit() else 1
+            headings.append([offset, level, para.text.strip()])
+        parts.append(para.text)
+        offset += len(para.text)
+    return _document(parts, [["document", None, 0, offset]], headings)
+
+def _plain_document(source):
+    if isinstance(source, (bytes, bytearray)):
+        text = source.decode("utf-8")
+    elif hasattr(source, "read"):
+        data = source.read()
+        text = data.decode("utf-8") if isinstance(data, bytes) else data
+    else:
+        with open(source, "r", encoding="utf-8") as f:
+            text = f.read()
+    return _document([text], [["document", None, 0, len(text)]], markdown_headings(text))
+
+_EXTRACTORS = {
+    ".docx": _docx_document,
+    ".pdf": _pdf_document,
+    ".pptx": _pptx_document,
+    ".txt": _plain_document,
+    ".md": _plain_document,
+}
+
+def extract_document(file_name, source, pdf_backend=None):
+    """
+    Extracts a document record (text, page/slide units and headings) from a
+    file given its name (for the extension) and its source: a path, a file
+    object or the raw bytes. PDFs are read with `pdf_backend` (default
+    DEFAULT_PDF_BACKEND). Raises ValueError for unsupported extensions and
+    lets parser errors propagate.
+    """
+    ext = os.path.splitext(file_name)[1].lower()
+    if ext not in _EXTRACTORS:
+        raise ValueError(f"File extension '{ext}' is not supported for direct extraction.")
+    if ext == ".pdf":
+        return _pdf_document(source, pdf_backend)
+    return _EXTRACTORS[ext](source)
+
+def extract_text(file_name, source, pdf_backend=None):
+    """Extracts just the text of a file; see extract_document."""
+    return extract_document(file_name, source, pdf_backend)["text"]
+
+def document_layout(document):
+    """Returns the part of a document record that describes its structure, without the text."""
+    return {"units": document["units"], "headings": document["headings"]}
+
+# --- Extraction cache ---
+
+@st.cache_resource
+def get_extraction_cache():
+    """Returns the process-wide extraction cache, or None if it is disabled or cannot be opened."""
+    if not EXTRACTION_CACHE_ENABLED:
+        return None
+    try:
+        return ExtractionCache(EXTRACTION_CACHE_PATH, max_disk_bytes=EXTRACTION_CACHE_MAX_DISK_BYTES)
+    except Exception as e:
+        print(f"Extraction cache disabled: {e}")
+        return None
+
+def _cache_key(file_name, source, pdf_backend=None):
+    """Returns the extraction cache key for a source, or None if its bytes cannot be read."""
+    version = EXTRACTOR_VERSION
+    if os.path.splitext(file_name)[1].lower() == ".pdf":
+        version = f"{EXTRACTOR_VERSION}-{pdf_backend or DEFAULT_PDF_BACKEND}"
+    try:
+        return make_extraction_key(content_hash(source), file_name, version)
+    except OSError:
+        return None
+
+def _cache_get(cache, key):
+    cached = cache.get(key) if key else None
+    return json.loads(cached) if cached is not None else None
+
+def _cache_set(cache, key, document):
+    if key:
+        cache.set(key, json.dumps(document, ensure_ascii=False))
+
+def cached_extract_document(file_name, source, cache=None, pdf_backend=None):
+    """Like extract_document, but returns the cached record for files whose content was already parsed."""
+    key = _cache_key(file_name, source, pdf_backend) if cache else None
+    document = _cache_get(cache, key)
+    if document is None:
+        document = extract_document(file_name, source, pdf_backend)
+        _cache_set(cache, key, document)
+    return document
+
+def cached_extract_text(file_name, source, cache=None, pdf_backend=None):
+    """Like extract_text, but served from the extraction cache when possible."""
+    return cached_extract_document(file_name, source, cache, pdf_backend)["text"]
+
+# --- Single-file helpers used by the Streamlit pages ---
 
 def extract_text_from_docx(path):
     """Extracts text from a .docx file."""
     try:
-        doc = Document(path)
-        return "\n".join([para.text for para in doc.paragraphs])
+        return _docx_document(path)["text"]
     except Exception as e:
         st.warning(f"Could not read DOCX file {os.path.basename(path)}: {e}")
         return ""
 
 def extract_text_from_pdf(path):
     """Extracts text from a .pdf file."""
-    text = ""
     try:
-        with pdfplumber.open(path) as pdf:
-            for page in pdf.pages:
-                page_text = page.extract_text()
-                if page_text:
-                    text += page_text + "\n"
-        return text
+        return _pdf_document(path)["text"]
     except Exception as e:
         st.warning(f"Could not read PDF file {os.path.basename(path)}: {e}")
         return ""
 
 def extract_text_from_pptx(path):
     """Extracts text from a .pptx file."""
-    text = ""
     try:
-        prs = Presentation(path)
-        for slide in prs.slides:
-            for shape in slide.shapes:
-                if hasattr(shape, "text"):
-                    text += shape.text + "\n"
-        return text
+        return _pptx_document(path)["text"]
     except Exception as e:
         st.warning(f"Could not read PPTX file {os.path.basename(path)}: {e}")
         return ""
 
-def extract_from_folder(root_folder):
+# --- Parallel extraction ---
+
+def _extraction_worker(conn, file_name, source, pdf_backend):
+    """Runs in a child process: extracts one file and sends back ('ok', document) or ('error', message)."""
+    try:
+        conn.send(("ok", extract_document(file_name, source, pdf_backend)))
+    except Exception as e:
+        conn.send(("error", f"{type(e).__name__}: {e}"))
+    finally:
+        conn.close()
+
+def _process_context():
+    # forkserver avoids forking the multi-threaded Streamlit server; the
+    # preloaded server process already has the parsers imported.
+    if "forkserver" in multiprocessing.get_all_start_methods():
+        ctx = multiprocessing.get_context("forkserver")
+        ctx.set_forkserver_preload(["data_extractor"])
+        return ctx
+    return multiprocessing.get_context("spawn")
+
+def extract_many(items, max_workers=EXTRACTION_MAX_WORKERS, timeout=EXTRACTION_TIMEOUT_SECONDS, progress_callback=None,
+                 cache=None, pdf_backend=None):
     """
-    Recursively extracts text from all supported files in a folder
-    and returns a dictionary with file paths and their content.
+    Extracts several files in parallel, one worker process per file with at
+    most `max_workers` alive at once. `items` is a list of (name, source)
+    pairs, where source is a path or the file's bytes; PDFs are read with
+    `pdf_backend`.
+
+    Returns (documents, errors): `documents` maps each successfully extracted
+    name to its document record (see extract_document), in input order; `errors` maps the others to a reason. A worker
+    that crashes or runs longer than `timeout` seconds is killed and reported
+    in `errors` without affecting the rest. `progress_callback(completed,
+    total, name)` is called from the calling thread after each file.
+
+    With a `cache`, files whose content was already parsed are answered from
+    it without starting a worker, and fresh results are stored in it.
     """
-    data = {}
-    supported_extensions = {".docx", ".pdf", ".pptx", ".txt", ".md"}
-    
+    items = list(items)
+    queue = []
+    running = {}  # receiving connection -> (index, name, key, process, started)
+    outcomes = {}
+    errors = {}
+
+    def report(name):
+        if progress_callback:
+            progress_callback(len(outcomes) + len(errors), len(items), name)
+
+    def finish(conn, index, name, key, process, status, payload):
+        conn.close()
+        process.join(timeout=1)
+        if process.is_alive():
+            process.kill()
+        if status == "ok":
+            outcomes[index] = (name, payload)
+            _cache_set(cache, key, payload)
+        else:
+            errors[name] = payload
+        report(name)
+
+    for index, (name, source) in enumerate(items):
+        key = _cache_key(name, source, pdf_backend) if cache else None
+        document = _cache_get(cache, key)
+        if document is not None:
+            outcomes[index] = (name, document)
+            report(name)
+        else:
+            queue.append((index, name, source, key))
+
+    ctx = _process_context() if queue else None
+    try:
+        while queue or running:
+            while queue and len(running) < max(1, max_workers):
+                index, name, source, key = queue.pop(0)
+                receiver, sender = ctx.Pipe(duplex=False)
+                process = ctx.Process(target=_extraction_worker, args=(sender, name, source, pdf_backend), daemon=True)
+                process.start()
+                sender.close()
+                running[receiver] = (index, name, key, process, time.monotonic())
+
+            ready = multiprocessing.connection.wait(list(running), timeout=0.5)
+            for conn in ready:
+                index, name, key, process, _ = running.pop(conn)
+                try:
+                    status, payload = conn.recv()
+                except EOFError:
+                    process.join(timeout=1)
+                    status, payload = "error", f"Worker crashed (exit code {process.exitcode})."
+                finish(conn, index, name, key, process, status, payload)
+
+            now = time.monotonic()
+            for conn, (index, name, key, process, started) in list(running.items()):
+                if now - started > timeout:
+                    running.pop(conn)
+                    process.kill()
+                    finish(conn, index, name, key, process, "error", f"Timed out after {timeout} s.")
+    finally:
+        for conn, (_, _, _, process, _) in running.items():
+            process.kill()
+            conn.close()
+
+    documents = {name: document for _, (name, document) in sorted(outcomes.items())}
+    return documents, errors
+
+def _supported_paths(root_folder):
+    """Returns the paths of all supported files under `root_folder`, in walk order."""
+    paths = []
     for dirpath, _, files in os.walk(root_folder):
         for file in files:
             ext = os.path.splitext(file)[1].lower()
-            if ext not in supported_extensions:
-                continue
-
-            full_path = os.path.join(dirpath, file)
-            text = ""
-            
-            if ext == ".docx":
-                text = extract_text_from_docx(full_path)
-            elif ext == ".pdf":
-                text = extract_text_from_pdf(full_path)
-            elif ext == ".pptx":
-                text = extract_text_from_pptx(full_path)
-            elif ext in [".txt", ".md"]:
-                try:
-                    with open(full_path, 'r', encoding='utf-8') as f:
-                        text = f.read()
-                except Exception as e:
-                    st.warning(f"Could not read text file {file}: {e}")
-                    text = ""
-            
-            if text.strip():
-                # Use relative path for cleaner keys
-                relative_path = os.path.relpath(full_path, root_folder)
-                data[relative_path] = text
+            if ext in SUPPORTED_EXTENSIONS:
+                paths.append(os.path.join(dirpath, file))
+    return paths
+
+def _extract_paths(paths, parallel=False, progress_callback=None, pdf_backend=None):
+    """Extracts the given files and returns {path: text}; failures are reported and left out."""
+    cache = get_extraction_cache()
+    if parallel:
+        documents, errors = extract_many(
+            [(path, path) for path in paths], progress_callback=progress_callback, cache=cache, pdf_backend=pdf_backend
+        )
+        for path, reason in errors.items():
+            st.warning(f"Could not read file {os.path.basename(path)}: {reason}")
+        return {path: document["text"] for path, document in documents.items()}
+
+    texts = {}
+    for i, full_path in enumerate(paths):
+        try:
+            texts[full_path] = cached_extract_text(full_path, full_path, cache, pdf_backend)
+        except Exception as e:
+            st.warning(f"Could not read file {os.path.basename(full_path)}: {e}")
+        if progress_callback:
+            progress_callback(i + 1, len(paths), full_path)
+    return texts
+
+def extract_from_folder(root_folder, parallel=False, progress_callback=None, pdf_backend=None):
+    """
+    Recursively extracts text from all supported files in a folder
+    and returns a dictionary with file paths and their content.
+    With `parallel=True` the files are parsed in worker processes.
+    Files already in the extraction cache are not parsed again.
+    """
+    texts = _extract_paths(_supported_paths(root_folder), parallel, progress_callback, pdf_backend)
+
+    data = {}
+    for full_path, text in texts.items():
+        if text.strip():
+            # Use relative path for cleaner keys
+            relative_path = os.path.relpath(full_path, root_folder)
+            data[relative_path] = text
                 
     return data
 
-def process_folder_and_save_json(folder_path, output_dir="output"):
+# --- Incremental folder indexing ---
+
+MANIFEST_VERSION = 1
+
+def _load_json(path):
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def _load_manifest(folder_path, manifest_path, storage, pdf_backend):
+    """
+    Returns the manifest's file entries from a previous run over the same
+    folder, with the same extractor, PDF backend and storage, or {} if
+    there is none.
+    """
+    manifest = _load_json(manifest_path)
+    if (
+        not isinstance(manifest, dict)
+        or manifest.get("version") != MANIFEST_VERSION
+        or manifest.get("extractor_version") != EXTRACTOR_VERSION
+        or manifest.get("pdf_backend") != pdf_backend
+        or manifest.get("storage") != storage
+        or manifest.get("root") != os.path.abspath(folder_path)
+    ):
+        return {}
+    return manifest.get("files", {})
+
+def index_folder(folder_path, previous_files, previous_paths, parallel=True, progress_callback=None, pdf_backend=None):
+    """
+    Works out how to bring a folder index up to date. `previous_files` maps
+    relative paths to their manifest entries (mtime_ns, size, sha256, and
+    empty for files without text) from the last run, and `previous_paths` is
+    the set of paths whose text was saved then.
+
+    A file whose mtime and size are unchanged is carried over without being
+    read; one whose metadata changed is hashed, and only re-extracted if its
+    content actually differs. Carrying over needs the saved text, so a file
+    missing from `previous_paths` (the knowledge-base file was deleted or
+    unreadable) is extracted again, unless its manifest entry records that
+    it had no text. Files no longer on disk are dropped.
+
+    Returns (order, updates, files, stats): the relative paths that have
+    text after this run, the freshly extracted {path: text} among them, the
+    new manifest entries and counts of added, changed, removed and
+    unchanged files.
+    """
+    stats = {"added": 0, "changed": 0, "removed": 0, "unchanged": 0}
+    files = {}
+    pending = {}  # full path -> (relative path, manifest entry)
+    carried = set()
+    seen = []
+
+    for full_path in _supported_paths(folder_path):
+        relative_path = os.path.relpath(full_path, folder_path)
+        try:
+            stat = os.stat(full_path)
+        except OSError as e:
+            st.warning(f"Could not read file {os.path.basename(full_path)}: {e}")
+            continue
+        seen.append(relative_path)
+        entry = {"mtime_ns": stat.st_mtime_ns, "size": stat.st_size}
+        previous = previous_files.get(relative_path)
+        text_saved = previous is not None and (relative_path in previous_paths or previous.get("empty", False))
+
+        if text_saved and previous.get("mtime_ns") == entry["mtime_ns"] and previous.get("size") == entry["size"]:
+            files[relative_path] = previous
+            carried.add(relative_path)
+            stats["unchanged"] += 1
+            continue
+
+        try:
+            entry["sha256"] = content_hash(full_path)
+        except OSError as e:
+            st.warning(f"Could not read file {os.path.basename(full_path)}: {e}")
+            continue
+        if text_saved and previous.get("sha256") == entry["sha256"]:
+            # Touched but not modified: keep the text, refresh the metadata.
+            if previous.get("empty"):
+                entry["empty"] = True
+            files[relative_path] = entry
+            carried.add(relative_path)
+            stats["unchanged"] += 1
+            continue
+
+        stats["changed" if previous and previous.get("sha256") != entry["sha256"] else "added"] += 1
+        pending[full_path] = (relative_path, entry)
+
+    stats["removed"] = len(set(previous_files) - set(seen))
+
+    updates = {}
+    for full_path, text in _extract_paths(list(pending), parallel, progress_callback, pdf_backend).items():
+        relative_path, entry = pending[full_path]
+        files[relative_path] = entry
+        if text.strip():
+            updates[relative_path] = text
+        else:
+            entry["empty"] = True
+
+    order = [p for p in seen if p in updates or (p in carried and p in previous_paths)]
+    return order, updates, files, stats
+
+def process_folder_and_save_json(folder_path, output_dir="output", parallel=True, incremental=True, storage="json",
+                                 pdf_backend=None):
     """
-    Processes a folder, extracts text, and saves it to a JSON file.
-    Returns the path to the JSON file or None if failed.
+    Processes a folder, extracts text, and saves it to a knowledge-base file.
+    Returns the path to the file or None if failed.
+
+    By default the text is written to data_content.json. With
+    storage="sqlite" it goes to data_content.sqlite3 instead, readable one
+    document at a time through KnowledgeBaseStore.
+
+    A manifest saved next to it records each file's mtime, size and hash;
+    with `incremental=True` only files added or changed since the last run
+    are extracted, and entries for deleted files are removed.
     """
+    if storage not in ("sqlite", "json"):
+        raise ValueError(f"Unknown knowledge-base storage: {storage}")
+    pdf_backend = pdf_backend or DEFAULT_PDF_BACKEND
+
     if not os.path.isdir(folder_path):
         st.error(f"The provided path is not a valid folder: {folder_path}")
         return None
         
     if not os.path.exists(output_dir):
         os.makedirs(output_dir)
-        
+
+    manifest_path = os.path.join(output_dir, "data_content.manifest.json")
+    previous_files = _load_manifest(folder_path, manifest_path, storage, pdf_backend) if incremental else {}
+    if storage == "sqlite":
+        data_path = os.path.join(output_dir, "data_content.sqlite3")
+        store = KnowledgeBaseStore(data_path)
+        previous_data = None
+        previous_paths = set(store.paths())
+    else:
+        data_path = os.path.join(output_dir, "data_content.json")
+        previous_data = (_load_json(data_path) or {}) if previous_files else {}
+        previous_paths = set(previous_data)
+
     st.info(f"Starting text extraction from folder: {folder_path}...")
-    extracted_data = extract_from_folder(folder_path)
+    order, updates, files, stats = index_folder(
+        folder_path, previous_files, previous_paths, parallel=parallel, pdf_backend=pdf_backend
+    )
     
-    if not extracted_data:
+    if not order:
         st.warning("No text could be extracted from the supported files in the folder.")
         return None
-        
-    json_path = os.path.join(output_dir, "data_content.json")
     
     try:
-        with open(json_path, "w", encoding="utf-8") as f:
-            json.dump(extracted_data, f, ensure_ascii=False, indent=4)
-        st.success(f"Extracted content from {len(extracted_data)} files and saved to {json_path}")
-        return json_path
+        if storage == "sqlite":
+            store.update(order, updates)
+        else:
+            data = {p: updates[p] if p in updates else previous_data[p] for p in order}
+            write_atomic(data_path, json.dumps(data, ensure_ascii=False, indent=4))
+        write_atomic(manifest_path, json.dumps({
+            "version": MANIFEST_VERSION,
+            "extractor_version": EXTRACTOR_VERSION,
+            "pdf_backend": pdf_backend,
+            "storage": storage,
+            "root": os.path.abspath(folder_path),
+            "files": files,
+        }, ensure_ascii=False))
+        st.success(
+            f"Saved content from {len(order)} files to {data_path} "
+            f"({stats['added']} added, {stats['changed']} changed, {stats['removed']} removed, "
+            f"{stats['unchanged']} unchanged)."
+        )
+        return data_path
     except Exception as e:
-        st.error(f"Failed to save data to JSON file: {e}")
-        return None
\ No newline at end of file
+        st.error(f"Failed to save the knowledge base: {e}")
+        return None
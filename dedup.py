@@ -0,0 +1,106 @@
+# praga/dedup.py
+
+import re
+import zlib
+from collections import defaultdict
+
+import numpy as np
+
+# Word 5-grams are long enough that unrelated course texts rarely share many,
+# and short enough that a re-typeset or lightly edited copy keeps most of them.
+SHINGLE_WORDS = 5
+NUM_PERMUTATIONS = 128
+LSH_BANDS = 32  # 32 bands of 4 rows: pairs above ~0.45 similarity become candidates
+DUPLICATE_THRESHOLD = 0.8
+
+_MERSENNE_PRIME = np.uint64((1 << 61) - 1)
+_MAX_HASH = np.uint64((1 << 32) - 1)
+_BLOCK = 2048
+_rng = np.random.RandomState(1729)
+_PERM_A = _rng.randint(1, 1 << 31, size=NUM_PERMUTATIONS, dtype=np.uint64)
+_PERM_B = _rng.randint(0, 1 << 31, size=NUM_PERMUTATIONS, dtype=np.uint64)
+
+_WORD = re.compile(r"\w+", re.UNICODE)
+
+
+def shingles(text, size=SHINGLE_WORDS):
+    """Returns the set of 32-bit hashes of the text's lower-cased word n-grams."""
+    words = _WORD.findall(text.lower())
+    if len(words) < size:
+        return {zlib.crc32(" ".join(words).encode("utf-8"))} if words else set()
+    return {zlib.crc32(" ".join(words[i:i + size]).encode("utf-8")) for i in range(len(words) - size + 1)}
+
+
+def minhash_signature(text):
+    """Returns the MinHash signature of a text, or None if it has no words."""
+    hashes = shingles(text)
+    if not hashes:
+        return None
+    x = np.fromiter(hashes, dtype=np.uint64, count=len(hashes))
+    signature = np.full(NUM_PERMUTATIONS, _MAX_HASH, dtype=np.uint64)
+    # Blocks keep the (shingles x permutations) matrix small for long documents.
+    for start in range(0, len(x), _BLOCK):
+        # a * x + b stays below 2**63 because a, b < 2**31 and x < 2**32.
+        permuted = (np.outer(x[start:start + _BLOCK], _PERM_A) + _PERM_B) % _MERSENNE_PRIME & _MAX_HASH
+        np.minimum(signature, permuted.min(axis=0), out=signature)
+    return signature
+
+
+def estimated_similarity(sig_a, sig_b):
+    """Estimated Jaccard similarity of the two shingle sets."""
+    return float(np.mean(sig_a == sig_b))
+
+
+def find_near_duplicates(data, threshold=DUPLICATE_THRESHOLD):
+    """
+    Finds files in {name: text} whose content is nearly identical. Candidate
+    pairs come from LSH banding of MinHash signatures and are confirmed when
+    their estimated similarity reaches `threshold`.
+
+    Returns {duplicate name: (kept name, similarity)}. Within each group of
+    near-duplicates the longest text is kept (earliest on ties), so the most
+    complete version of a lecture or worksheet survives.
+    """
+    names = list(data)
+    order = {name: i for i, name in enumerate(names)}
+    signatures = {name: minhash_signature(data[name]) for name in names}
+    signatures = {name: sig for name, sig in signatures.items() if sig is not None}
+
+    rows = NUM_PERMUTATIONS // LSH_BANDS
+    buckets = defaultdict(list)
+    for name, sig in signatures.items():
+        for band in range(LSH_BANDS):
+            buckets[(band, sig[band * rows:(band + 1) * rows].tobytes())].append(name)
+
+    parent = {name: name for name in signatures}
+
+    def root(name):
+        while parent[name] != name:
+            parent[name] = parent[parent[name]]
+            name = parent[name]
+        return name
+
+    checked = set()
+    for members in buckets.values():
+        for i, a in enumerate(members):
+            for b in members[i + 1:]:
+                if (a, b) in checked:
+                    continue
+                checked.add((a, b))
+                if estimated_similarity(signatures[a], signatures[b]) >= threshold:
+                    parent[root(b)] = root(a)
+
+    groups = defaultdict(list)
+    for name in names:
+        if name in signatures:
+            groups[root(name)].append(name)
+
+    duplicates = {}
+    for members in groups.values():
+        if len(members) < 2:
+            continue
+        kept = max(members, key=lambda n: (len(data[n]), -order[n]))
+        for name in members:
+            if name != kept:
+                duplicates[name] = (kept, estimated_similarity(signatures[name], signatures[kept]))
+    return duplicates
@@ -0,0 +1,144 @@
+# praga/dense_index.py
+
+import zlib
+
+import numpy as np
+
+from search_index import tokenize
+
+# Hashed vocabulary size; collisions are rare at course-material scale and
+# keep the term matrix a fixed 2**14 x EMBEDDING_DIM float32 (8 MB).
+HASH_BUCKETS = 1 << 14
+EMBEDDING_DIM = 128
+# Long words also count through their first letters, a crude stemmer that
+# lets "rasterisation", "rasterization" and "rasterize" share a feature.
+STEM_PREFIX = 7
+OVERSAMPLES = 10
+POWER_ITERATIONS = 2
+# Non-zeros handled per block in the sparse products, bounding scratch memory.
+_BLOCK_NNZ = 1 << 15
+
+
+def _features(text):
+    tokens = tokenize(text)
+    return tokens + [token[:STEM_PREFIX] for token in tokens if len(token) > STEM_PREFIX]
+
+
+def _hashed_counts(text):
+    """Returns (buckets, sublinear term frequencies) of a text's hashed features."""
+    features = _features(text)
+    if not features:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+    hashes = np.fromiter((zlib.crc32(f.encode("utf-8")) for f in features), dtype=np.int64, count=len(features))
+    buckets, counts = np.unique(hashes & (HASH_BUCKETS - 1), return_counts=True)
+    return buckets, (1 + np.log(counts)).astype(np.float32)
+
+
+def _segment_sums(ptr, gather, weights, rows, width):
+    """
+    out[i] = sum over j in ptr[i]:ptr[i+1] of weights[j] * rows[gather[j]],
+    i.e. a sparse (CSR-ordered) times dense product, computed blockwise with
+    prefix sums so empty segments need no special casing.
+    """
+    segments = len(ptr) - 1
+    out = np.zeros((segments, width), dtype=np.float32)
+    start = 0
+    while start < segments:
+        end = start + 1
+        while end < segments and ptr[end + 1] - ptr[start] <= _BLOCK_NNZ:
+            end += 1
+        lo, hi = ptr[start], ptr[end]
+        if hi > lo:
+            contrib = weights[lo:hi, None].astype(np.float64) * rows[gather[lo:hi]]
+            sums = np.vstack([np.zeros((1, width)), np.cumsum(contrib, axis=0)])
+            bounds = ptr[start:end + 1] - lo
+            out[start:end] = sums[bounds[1:]] - sums[bounds[:-1]]
+        start = end
+    return out
+
+
+class DenseIndex:
+    """
+    Latent semantic index over a list of texts, built with NumPy only.
+
+    Texts become L2-normalised hashed TF-IDF vectors; a randomized SVD
+    (random projection followed by power iterations) reduces them to
+    `dim` latent dimensions learned from the corpus itself, so terms that
+    co-occur, such as "Bresenham" and "line rasterisation", end up close
+    even when a query shares no words with a passage. Embeddings are kept
+    in one contiguous, row-normalised float32 matrix, and a lookup is a
+    single matrix-vector product.
+    """
+
+    def __init__(self, texts, dim=EMBEDDING_DIM, seed=0):
+        rows = [_hashed_counts(text) for text in texts]
+        self.size = len(rows)
+        indptr = np.zeros(self.size + 1, dtype=np.int64)
+        indptr[1:] = np.cumsum([len(buckets) for buckets, _ in rows])
+        indices = np.concatenate([buckets for buckets, _ in rows]) if rows else np.zeros(0, dtype=np.int64)
+        data = np.concatenate([tf for _, tf in rows]) if rows else np.zeros(0, dtype=np.float32)
+
+        df = np.bincount(indices, minlength=HASH_BUCKETS)
+        self.idf = (np.log((1 + self.size) / (1 + df)) + 1).astype(np.float32)
+        data = data * self.idf[indices]
+        row_of = np.repeat(np.arange(self.size), np.diff(indptr))
+        norms = np.sqrt(np.bincount(row_of, weights=data.astype(np.float64) ** 2, minlength=self.size))
+        data = (data / np.maximum(norms[row_of], 1e-12)).astype(np.float32)
+
+        # Column-ordered copy of the same matrix for transposed products.
+        order = np.argsort(indices, kind="stable")
+        colptr = np.zeros(HASH_BUCKETS + 1, dtype=np.int64)
+        colptr[1:] = np.cumsum(df)
+
+        def matmul(dense):      # A @ dense
+            return _segment_sums(indptr, indices, data, dense, dense.shape[1])
+
+        def rmatmul(dense):     # A.T @ dense
+            return _segment_sums(colptr, row_of[order], data[order], dense, dense.shape[1])
+
+        # At full rank the SVD just reproduces the TF-IDF space; keeping at most
+        # half as many dimensions as texts forces co-occurring terms together.
+        rank = min(dim, self.size // 2, int(np.count_nonzero(df)))
+        self.dim = rank
+        if rank < 2:
+            self.term_vectors = np.zeros((HASH_BUCKETS, max(rank, 1)), dtype=np.float32)
+            self.matrix = np.zeros((self.size, max(rank, 1)), dtype=np.float32)
+            return
+
+        width = min(rank + OVERSAMPLES, self.size)
+        rng = np.random.default_rng(seed)
+        q, _ = np.linalg.qr(matmul(rng.standard_normal((HASH_BUCKETS, width)).astype(np.float32)))
+        for _ in range(POWER_ITERATIONS):
+            q, _ = np.linalg.qr(rmatmul(q))
+            q, _ = np.linalg.qr(matmul(q))
+        small = rmatmul(q).T                      # width x HASH_BUCKETS
+        u, s, vt = np.linalg.svd(small, full_matrices=False)
+
+        self.term_vectors = np.ascontiguousarray(vt[:rank].T, dtype=np.float32)
+        matrix = (q @ u[:, :rank]) * s[:rank]
+        lengths = np.linalg.norm(matrix, axis=1, keepdims=True)
+        self.matrix = np.ascontiguousarray(matrix / np.maximum(lengths, 1e-12), dtype=np.float32)
+
+    def __len__(self):
+        return self.size
+
+    def embed(self, text):
+        """Returns the normalised latent vector of a query, or None if it has no known features."""
+        buckets, tf = _hashed_counts(text)
+        if not len(buckets):
+            return None
+        vector = (tf * self.idf[buckets]) @ self.term_vectors[buckets]
+        length = np.linalg.norm(vector)
+        return vector / length if length > 0 else None
+
+    def top(self, query, limit=10, min_score=0.1):
+        """Returns [(doc_id, cosine)] for the `limit` nearest texts scoring at least `min_score`, best first."""
+        vector = self.embed(query)
+        if vector is None or not self.size:
+            return []
+        scores = self.matrix @ vector
+        candidates = np.flatnonzero(scores >= min_score)
+        if len(candidates) > limit:
+            candidates = candidates[np.argpartition(-scores[candidates], limit - 1)[:limit]]
+        ranked = candidates[np.lexsort((candidates, -scores[candidates]))]
+        return [(int(doc_id), float(scores[doc_id])) for doc_id in ranked]
@@ -0,0 +1,126 @@
+# praga/documents.py
+
+import re
+
+# Target chunk size in characters (~350 tokens). Chunks are cut at paragraph
+# or line breaks, so real sizes vary around this.
+CHUNK_TARGET_CHARS = 1200
+
+UNIT_LABELS = {"page": "page", "slide": "slide"}
+
+MARKDOWN_HEADING = re.compile(r"^(#{1,6})[ \t]+(.+?)[ \t#]*$", re.MULTILINE)
+
+
+def markdown_headings(text):
+    """Returns [offset, level, title] for each markdown heading line in `text`."""
+    return [[m.start(), len(m.group(1)), m.group(2)] for m in MARKDOWN_HEADING.finditer(text)]
+
+
+def _split_span(text, start, end, target):
+    """Splits text[start:end] into (start, end) spans of about `target` characters at natural breaks."""
+    spans = []
+    chunk_start = start
+    while chunk_start < end:
+        limit = chunk_start + target
+        if end <= limit:
+            cut = end
+        else:
+            # Prefer a paragraph break in the second half of the window, then a line break, then a space.
+            cut = text.rfind("\n\n", chunk_start + target // 2, limit) + 2
+            if cut < 2:
+                cut = text.rfind("\n", chunk_start + target // 4, limit) + 1
+            if cut < 1:
+                cut = text.rfind(" ", chunk_start + target // 4, limit) + 1
+            if cut < 1:
+                cut = limit
+        if text[chunk_start:cut].strip():
+            spans.append((chunk_start, cut))
+        chunk_start = cut
+    return spans
+
+
+def build_chunks(file_name, text, layout=None, target=CHUNK_TARGET_CHARS):
+    """
+    Splits one file's text into chunk records, never across a page, slide
+    or heading boundary. `layout` is the structure part of the extracted document
+    (units and headings); without one the file is treated as a single unit
+    and markdown-style headings are picked up from the text.
+
+    Each chunk is {"id", "file", "unit", "number", "heading_path", "start",
+    "end"}, where start/end are offsets into `text`.
+    """
+    if layout:
+        units, headings = layout["units"], layout["headings"]
+    else:
+        units = [["document", None, 0, len(text)]]
+        headings = markdown_headings(text)
+
+    headings = sorted(headings)
+    offsets = [offset for offset, _, _ in headings]
+    chunks, stack, next_heading = [], [], 0
+    for kind, number, unit_start, unit_end in units:
+        # Sections start at headings, so a chunk never straddles one.
+        bounds = [unit_start] + [o for o in offsets if unit_start < o < unit_end] + [unit_end]
+        spans = [span for a, b in zip(bounds, bounds[1:]) for span in _split_span(text, a, b, target)]
+        for start, end in spans:
+            # Headings are consumed in order, keeping a stack of the enclosing ones.
+            while next_heading < len(headings) and headings[next_heading][0] <= start:
+                _, level, title = headings[next_heading]
+                while stack and stack[-1][0] >= level:
+                    stack.pop()
+                stack.append((level, title))
+                next_heading += 1
+            chunks.append({
+                "id": f"{file_name}#{len(chunks) + 1}",
+                "file": file_name,
+                "unit": kind,
+                "number": number,
+                "heading_path": [title for _, title in stack],
+                "start": start,
+                "end": end,
+            })
+    return chunks
+
+
+def citation(chunk):
+    """Human-readable source of a chunk, e.g. "lecture.pdf, page 4 › Clipping"."""
+    parts = [chunk["file"]]
+    if chunk["unit"] in UNIT_LABELS and chunk["number"] is not None:
+        parts[0] += f", {UNIT_LABELS[chunk['unit']]} {chunk['number']}"
+    if chunk["heading_path"]:
+        parts.append(" › ".join(chunk["heading_path"]))
+    return " › ".join(parts)
+
+
+class DocumentIndex:
+    """
+    Chunk-level view of a knowledge base ({file: text}). Chunks are
+    addressed by id ("<file>#<n>") and their text is sliced out of the
+    original strings on demand, so the index itself holds only offsets.
+    """
+
+    def __init__(self, data, layouts=None, target=CHUNK_TARGET_CHARS):
+        self.data = data
+        self.chunks = []
+        for file_name, text in data.items():
+            self.chunks.extend(build_chunks(file_name, text, (layouts or {}).get(file_name), target))
+        self._by_id = {chunk["id"]: chunk for chunk in self.chunks}
+
+    def __len__(self):
+        return len(self.chunks)
+
+    def __contains__(self, chunk_id):
+        return chunk_id in self._by_id
+
+    def get(self, chunk_id):
+        """Returns the chunk record for `chunk_id`, or None."""
+        return self._by_id.get(chunk_id)
+
+    def text(self, chunk):
+        """Returns a chunk's text; `chunk` is a record or an id."""
+        if isinstance(chunk, str):
+            chunk = self._by_id[chunk]
+        return self.data[chunk["file"]][chunk["start"]:chunk["end"]].strip()
+
+    def chunks_for_file(self, file_name):
+        return [chunk for chunk in self.chunks if chunk["file"] == file_name]
@@ -0,0 +1,103 @@
+# praga/extraction_cache.py
+
+import hashlib
+import os
+import sqlite3
+import time
+import zlib
+from contextlib import contextmanager
+
+
+def content_hash(source):
+    """Returns the SHA-256 hex digest of a file's bytes, given the bytes or a path."""
+    if isinstance(source, (bytes, bytearray)):
+        return hashlib.sha256(source).hexdigest()
+    with open(source, "rb") as f:
+        return hashlib.file_digest(f, "sha256").hexdigest()
+
+
+def make_extraction_key(digest, file_name, extractor_version):
+    """
+    Cache key for an extracted document. The extension is part of the key
+    because it selects the parser; the rest of the file name is not, so a
+    renamed re-upload still hits.
+    """
+    ext = os.path.splitext(file_name)[1].lower()
+    return f"{extractor_version}:{ext}:{digest}"
+
+
+class ExtractionCache:
+    """
+    Persistent cache of extracted documents, serialized as strings and keyed
+    by content hash and extractor version. Values are stored zlib-compressed
+    in a SQLite table; once the table grows past `max_disk_bytes` the least
+    recently used rows are evicted. Entries never expire on their own, since
+    a key can only ever map to one document.
+    """
+
+    def __init__(self, db_path, max_disk_bytes=500 * 1024 * 1024):
+        self.db_path = db_path
+        self.max_disk_bytes = max_disk_bytes
+        self._init_db()
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=10)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def _init_db(self):
+        directory = os.path.dirname(self.db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS extractions ("
+                "key TEXT PRIMARY KEY, text BLOB NOT NULL, size INTEGER NOT NULL, "
+                "created_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_extractions_accessed ON extractions(accessed_at)")
+
+    def get(self, key):
+        """Returns the cached value for `key`, or None on a miss."""
+        try:
+            with self._connect() as conn:
+                row = conn.execute("SELECT text FROM extractions WHERE key = ?", (key,)).fetchone()
+                if row is None:
+                    return None
+                conn.execute("UPDATE extractions SET accessed_at = ? WHERE key = ?", (time.time(), key))
+            return zlib.decompress(row[0]).decode("utf-8")
+        except (sqlite3.Error, zlib.error) as e:
+            print(f"Extraction cache read failed: {e}")
+            return None
+
+    def set(self, key, value):
+        """Stores a value and trims the table if needed."""
+        blob = zlib.compress(value.encode("utf-8"), 6)
+        now = time.time()
+        try:
+            with self._connect() as conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO extractions (key, text, size, created_at, accessed_at) VALUES (?, ?, ?, ?, ?)",
+                    (key, blob, len(blob), now, now)
+                )
+                self._evict(conn)
+        except sqlite3.Error as e:
+            print(f"Extraction cache write failed: {e}")
+
+    def _evict(self, conn):
+        total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM extractions").fetchone()[0]
+        if total <= self.max_disk_bytes:
+            return
+        for key, size in conn.execute("SELECT key, size FROM extractions ORDER BY accessed_at").fetchall():
+            conn.execute("DELETE FROM extractions WHERE key = ?", (key,))
+            total -= size
+            if total <= self.max_disk_bytes:
+                break
+
+    def clear(self):
+        with self._connect() as conn:
+            conn.execute("DELETE FROM extractions")
@@ -0,0 +1,133 @@
+# praga/kb_store.py
+
+import os
+import sqlite3
+import zlib
+from collections.abc import Mapping
+from contextlib import contextmanager
+
+# Documents shorter than this are stored as plain UTF-8; compressing them
+# saves little and costs a decompress on every read.
+MIN_COMPRESS_BYTES = 1024
+
+
+class KnowledgeBaseStore(Mapping):
+    """
+    Read-mostly {file path: text} store backed by a SQLite file, one row per
+    document with optional zlib compression. It behaves like the
+    processed_data dict but never loads more than it is asked for: a lookup
+    reads a single row, `items()` streams the rows in batches, and `sizes()`
+    answers from metadata without touching any text.
+    """
+
+    def __init__(self, db_path, compress=True, compression_level=6):
+        self.db_path = db_path
+        self.compress = compress
+        self.compression_level = compression_level
+        self._init_db()
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=10)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def _init_db(self):
+        directory = os.path.dirname(self.db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS documents ("
+                "path TEXT PRIMARY KEY, position INTEGER NOT NULL, text BLOB NOT NULL, "
+                "compressed INTEGER NOT NULL, chars INTEGER NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_documents_position ON documents(position)")
+
+    def _encode(self, text):
+        data = text.encode("utf-8")
+        if self.compress and len(data) >= MIN_COMPRESS_BYTES:
+            return zlib.compress(data, self.compression_level), 1
+        return data, 0
+
+    @staticmethod
+    def _decode(blob, compressed):
+        data = zlib.decompress(blob) if compressed else blob
+        return data.decode("utf-8")
+
+    def __getitem__(self, path):
+        with self._connect() as conn:
+            row = conn.execute("SELECT text, compressed FROM documents WHERE path = ?", (path,)).fetchone()
+        if row is None:
+            raise KeyError(path)
+        return self._decode(*row)
+
+    def __contains__(self, path):
+        with self._connect() as conn:
+            return conn.execute("SELECT 1 FROM documents WHERE path = ?", (path,)).fetchone() is not None
+
+    def __len__(self):
+        with self._connect() as conn:
+            return conn.execute("SELECT COUNT(*) FROM documents").fetchone()[0]
+
+    def __iter__(self):
+        return iter(self.paths())
+
+    def paths(self):
+        """Returns the document paths in insertion order."""
+        with self._connect() as conn:
+            return [row[0] for row in conn.execute("SELECT path FROM documents ORDER BY position")]
+
+    def sizes(self):
+        """Returns {path: length in characters} without reading any text."""
+        with self._connect() as conn:
+            return dict(conn.execute("SELECT path, chars FROM documents ORDER BY position").fetchall())
+
+    def items(self, batch_size=16):
+        """Yields (path, text) pairs in order, holding at most `batch_size` documents in memory."""
+        with self._connect() as conn:
+            cursor = conn.execute("SELECT path, text, compressed FROM documents ORDER BY position")
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+                for path, blob, compressed in rows:
+                    yield path, self._decode(blob, compressed)
+
+    def values(self, batch_size=16):
+        for _, text in self.items(batch_size):
+            yield text
+
+    def update(self, order, texts):
+        """
+        Makes the store hold exactly the paths in `order`, in that order.
+        `texts` supplies the text of new or changed documents; every other
+        path in `order` must already be stored and keeps its text untouched.
+        Paths not in `order` are deleted.
+        """
+        with self._connect() as conn:
+            conn.execute("CREATE TEMP TABLE keep (path TEXT PRIMARY KEY, position INTEGER NOT NULL)")
+            conn.executemany("INSERT INTO keep (path, position) VALUES (?, ?)", [(p, i) for i, p in enumerate(order)])
+            conn.execute("DELETE FROM documents WHERE path NOT IN (SELECT path FROM keep)")
+            conn.execute(
+                "UPDATE documents SET position = (SELECT position FROM keep WHERE keep.path = documents.path)"
+            )
+            positions = {path: i for i, path in enumerate(order)}
+            for path, text in texts.items():
+                blob, compressed = self._encode(text)
+                conn.execute(
+                    "INSERT OR REPLACE INTO documents (path, position, text, compressed, chars) VALUES (?, ?, ?, ?, ?)",
+                    (path, positions[path], blob, compressed, len(text))
+                )
+            conn.execute("DROP TABLE keep")
+
+    def replace_all(self, data):
+        """Replaces the whole store with the {path: text} mapping `data`."""
+        self.update(list(data), dict(data))
+
+    def to_dict(self):
+        """Loads every document; only for callers that really need all of them at once."""
+        return dict(self.items())
@@ -0,0 +1,143 @@
+# praga/knowledge_base.py
+
+import hashlib
+import json
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import cached_property
+from types import MappingProxyType
+
+from context_packer import estimate_tokens, pack_sections
+from dense_index import DenseIndex
+from documents import DocumentIndex
+from search_index import BM25Index
+
+CURRICULUM_FILE_SEPARATOR = "\n\n--- FILE SEPARATOR ---\n\n"
+SUMMARY_CHARS = 200
+# Packed contexts kept per snapshot; pages ask for a handful of distinct budgets.
+PACKED_CONTEXT_ENTRIES = 8
+
+# Semantic indexes are built off the script thread so uploads return at once.
+_INDEX_EXECUTOR = ThreadPoolExecutor(max_workers=2, thread_name_prefix="dense-index")
+
+
+def document_digest(text):
+    """SHA-256 hex digest of one file's text."""
+    return hashlib.sha256(text.encode("utf-8", "surrogatepass")).hexdigest()
+
+
+def knowledge_base_version(digests, layouts=None):
+    """
+    Content-derived id of a set of materials, given {file: document_digest}:
+    equal materials (names, texts and structure) give equal ids.
+    """
+    digest = hashlib.sha256()
+    for name, text_digest in digests.items():
+        for part in (name, text_digest, json.dumps((layouts or {}).get(name), separators=(",", ":"))):
+            digest.update(part.encode("utf-8", "surrogatepass"))
+            digest.update(b"\0")
+    return digest.hexdigest()[:16]
+
+
+class KnowledgeBase:
+    """
+    Immutable snapshot of a set of materials ({file: text}, plus optional
+    page/slide layouts) identified by a content-derived version id.
+
+    Everything derived from the materials (the joined text, per-file
+    summaries and token counts, packed contexts, the chunk, keyword and
+    semantic indexes) is computed on first use and then kept for the
+    snapshot's lifetime. Loading different materials means building a new
+    snapshot, which is the only point where these are invalidated.
+    """
+
+    def __init__(self, data, layouts=None, digests=None):
+        self.data = MappingProxyType(dict(data))
+        self.layouts = MappingProxyType({name: layouts[name] for name in self.data if name in layouts} if layouts else {})
+        if digests is None:
+            digests = {name: document_digest(text) for name, text in self.data.items()}
+        self.digests = MappingProxyType(dict(digests))
+        self.version = knowledge_base_version(self.digests, self.layouts)
+        self._packed = {}
+        self._dense_future = None
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.data)
+
+    def __repr__(self):
+        return f"KnowledgeBase(version={self.version!r}, files={len(self)})"
+
+    @cached_property
+    def full_text(self):
+        """All materials joined, each headed by its file name."""
+        return CURRICULUM_FILE_SEPARATOR.join(
+            f"Content from file '{path}':\n{content}"
+            for path, content in self.data.items()
+        )
+
+    @cached_property
+    def file_summaries(self):
+        """{file: its first SUMMARY_CHARS characters}."""
+        return MappingProxyType({name: text[:SUMMARY_CHARS] for name, text in self.data.items()})
+
+    @cached_property
+    def token_counts(self):
+        """{file: estimated tokens}."""
+        return MappingProxyType({name: estimate_tokens(text) for name, text in self.data.items()})
+
+    @cached_property
+    def total_tokens(self):
+        return sum(self.token_counts.values())
+
+    @cached_property
+    def text_size(self):
+        """Characters of text held, the basis for memory accounting."""
+        return sum(len(text) for text in self.data.values())
+
+    @cached_property
+    def document_index(self):
+        return DocumentIndex(self.data, self.layouts)
+
+    @cached_property
+    def search_index(self):
+        """BM25 index over the chunks of document_index."""
+        index = self.document_index
+        return BM25Index([index.text(chunk) for chunk in index.chunks])
+
+    def start_dense_index(self):
+        """Starts building the semantic index in the background, once."""
+        with self._lock:
+            if self._dense_future is None:
+                index = self.document_index
+                self._dense_future = _INDEX_EXECUTOR.submit(
+                    lambda: DenseIndex([index.text(chunk) for chunk in index.chunks])
+                )
+
+    @property
+    def dense_index(self):
+        """The semantic index if it has finished building, otherwise None (without waiting)."""
+        self.start_dense_index()
+        if not self._dense_future.done():
+            return None
+        try:
+            return self._dense_future.result()
+        except Exception as e:
+            print(f"Semantic index could not be built: {e}")
+            return None
+
+    def packed(self, token_budget):
+        """
+        All materials packed into `token_budget` tokens (whole files first, then
+        whole paragraphs of the files that no longer fit), memoized per budget.
+        """
+        with self._lock:
+            if token_budget in self._packed:
+                return self._packed[token_budget]
+        sections = [(f"Content from file '{path}':", content) for path, content in self.data.items()]
+        packed, _ = pack_sections(sections, token_budget, separator=CURRICULUM_FILE_SEPARATOR)
+        with self._lock:
+            if len(self._packed) >= PACKED_CONTEXT_ENTRIES:
+                self._packed.pop(next(iter(self._packed)))
+            self._packed[token_budget] = packed
+        return packed
@@ -7,7 +7,10 @@ import time
 import pytz
 
 # Import utility functions and page modules
-from utils import init_ai_service_client
+import pandas as pd
+import telemetry
+from utils import init_ai_service_client, get_telemetry, get_model_router, get_session_memory, get_shared_knowledge_bases, track_session, finish_session
+from session_memory import session_memory_report
 import page_materials_upload
 import page_materials_analysis
 import page_chat
@@ -23,80 +26,116 @@ st.set_page_config(
 )
 
 # --- Session State Initialization ---
-if 'ai_client' not in st.session_state:
-    st.session_state.ai_client = init_ai_service_client()
-# 'data_context_loaded' is now replaced by checking if 'processed_data' exists in the session
-if 'processed_data' not in st.session_state:
-    st.session_state.processed_data = None
-
-ai_client = st.session_state.ai_client
-
-# --- Main Title and Information ---
-st.title("🎓 Educational AI Platform")
-st.caption("An interactive platform for didactic analysis, content generation, and AI-assisted learning.")
-
-if ai_client is None:
-    st.error("The AI service could not be initialized. Functionality is limited.")
-
-# --- Navigation ---
-st.sidebar.title("Navigation Menu")
-
-context_is_loaded = st.session_state.processed_data is not None
-
-menu_options = {
-    "📚 Upload & Process Materials": "upload",
-    "📊 Didactic Analysis vs. Competencies": "materials_analysis",
-    "💬 AI Chat Based on Materials": "chat",
-    "💡 Topic Explainer from Materials": "explainer",
-    "❓ Quiz Generator": "quiz",
-    "🌐 Web & Video Analyzer": "web_analyzer"
-}
-
-disabled_options = []
-if not context_is_loaded:
-    disabled_options = [
-        "📊 Didactic Analysis vs. Competencies",
-        "💬 AI Chat Based on Materials",
-        "💡 Topic Explainer from Materials",
-        "❓ Quiz Generator"
-    ]
-
-choice_label = st.sidebar.radio(
-    "Choose a module:",
-    options=menu_options.keys(),
-    captions=["" if opt not in disabled_options else "Requires material processing" for opt in menu_options.keys()],
-    key="main_nav_radio"
-)
-
-st.sidebar.markdown("---")
-
-# --- Display Selected Page ---
-current_page = menu_options[choice_label]
-
-if choice_label in disabled_options:
-    st.warning(f"Please upload and process a folder with materials in the 'Upload & Process Materials' module to access '{choice_label}'.")
-    st.stop()
-
-if current_page == "upload":
-    page_materials_upload.render_page(ai_client)
-elif current_page == "materials_analysis":
-    page_materials_analysis.render_page(ai_client)
-elif current_page == "chat":
-    page_chat.render_page(ai_client)
-elif current_page == "explainer":
-    page_explainer.render_page(ai_client)
-elif current_page == "quiz":
-    page_quiz.render_page(ai_client)
-elif current_page == "web_analyzer":
-    page_web_analyzer.render_page(ai_client)
-
-# --- Sidebar Information ---
-st.sidebar.markdown("---")
-st.sidebar.info("Educational AI Platform v2.1")
+# Brings back anything spilled to disk while the session was idle, and keeps
+# the session from being spilled until this run ends.
+track_session()
 try:
-    # This can be localized if needed
-    london_tz = pytz.timezone('Europe/London')
-    current_time_obj = datetime.now(london_tz)
-    st.sidebar.markdown(f"Current Time (London):<br>**{current_time_obj.strftime('%d-%b-%Y %H:%M:%S')}**", unsafe_allow_html=True)
-except Exception:
-    st.sidebar.markdown(f"Server Time: {time.strftime('%d-%b-%Y %H:%M:%S')}")
\ No newline at end of file
+    if 'ai_client' not in st.session_state:
+        st.session_state.ai_client = init_ai_service_client()
+    # 'data_context_loaded' is now replaced by checking if 'processed_data' exists in the session
+    if 'processed_data' not in st.session_state:
+        st.session_state.processed_data = None
+
+    ai_client = st.session_state.ai_client
+
+    # --- Main Title and Information ---
+    st.title("🎓 Educational AI Platform")
+    st.caption("An interactive platform for didactic analysis, content generation, and AI-assisted learning.")
+
+    if ai_client is None:
+        st.error("The AI service could not be initialized. Functionality is limited.")
+
+    # --- Navigation ---
+    st.sidebar.title("Navigation Menu")
+
+    context_is_loaded = st.session_state.processed_data is not None
+
+    menu_options = {
+        "📚 Upload & Process Materials": "upload",
+        "📊 Didactic Analysis vs. Competencies": "materials_analysis",
+        "💬 AI Chat Based on Materials": "chat",
+        "💡 Topic Explainer from Materials": "explainer",
+        "❓ Quiz Generator": "quiz",
+        "🌐 Web & Video Analyzer": "web_analyzer"
+    }
+
+    disabled_options = []
+    if not context_is_loaded:
+        disabled_options = [
+            "📊 Didactic Analysis vs. Competencies",
+            "💬 AI Chat Based on Materials",
+            "💡 Topic Explainer from Materials",
+            "❓ Quiz Generator"
+        ]
+
+    choice_label = st.sidebar.radio(
+        "Choose a module:",
+        options=menu_options.keys(),
+        captions=["" if opt not in disabled_options else "Requires material processing" for opt in menu_options.keys()],
+        key="main_nav_radio"
+    )
+
+    st.sidebar.markdown("---")
+
+    # --- AI Telemetry Debug Panel ---
+    if st.sidebar.checkbox("🛠️ Show AI telemetry", key="show_ai_telemetry"):
+        with st.sidebar.expander("AI calls", expanded=True):
+            ai_telemetry = get_telemetry()
+            summary_rows = ai_telemetry.summary()
+            if summary_rows:
+                st.dataframe(pd.DataFrame(summary_rows).set_index("page"))
+                st.caption("Most recent calls:")
+                st.dataframe(pd.DataFrame(ai_telemetry.recent(20)[::-1]))
+            else:
+                st.caption("No AI calls recorded yet.")
+            router_stats = get_model_router().snapshot()
+            if router_stats:
+                st.caption("Model router:")
+                st.dataframe(pd.DataFrame.from_dict(router_stats, orient="index"))
+
+    # --- Session Memory Debug Panel ---
+    if st.sidebar.checkbox("🧠 Show session memory", key="show_session_memory"):
+        with st.sidebar.expander("Memory", expanded=True):
+            rows = session_memory_report(st.session_state.to_dict())
+            st.caption(f"This session: ~{sum(size for _, size, _ in rows) / 1024:,.0f} KiB (shared knowledge base not included)")
+            st.dataframe(pd.DataFrame(rows, columns=["key", "bytes", "shared"]).set_index("key"))
+            st.caption("All sessions:")
+            st.dataframe(pd.DataFrame(get_session_memory().stats()))
+            st.caption("Shared knowledge bases:")
+            st.json(get_shared_knowledge_bases().stats())
+
+    # --- Display Selected Page ---
+    current_page = menu_options[choice_label]
+    # Attributes AI calls made during this run to the page that issued them.
+    telemetry.current_page.set(current_page)
+
+    if choice_label in disabled_options:
+        st.warning(f"Please upload and process a folder with materials in the 'Upload & Process Materials' module to access '{choice_label}'.")
+        st.stop()
+
+    if current_page == "upload":
+        page_materials_upload.render_page(ai_client)
+    elif current_page == "materials_analysis":
+        page_materials_analysis.render_page(ai_client)
+    elif current_page == "chat":
+        page_chat.render_page(ai_client)
+    elif current_page == "explainer":
+        page_explainer.render_page(ai_client)
+    elif current_page == "quiz":
+        page_quiz.render_page(ai_client)
+    elif current_page == "web_analyzer":
+        page_web_analyzer.render_page(ai_client)
+
+    # --- Sidebar Information ---
+    st.sidebar.markdown("---")
+    st.sidebar.info("Educational AI Platform v2.1")
+    try:
+        # This can be localized if needed
+        london_tz = pytz.timezone('Europe/London')
+        current_time_obj = datetime.now(london_tz)
+        st.sidebar.markdown(f"Current Time (London):<br>**{current_time_obj.strftime('%d-%b-%Y %H:%M:%S')}**", unsafe_allow_html=True)
+    except Exception:
+        st.sidebar.markdown(f"Server Time: {time.strftime('%d-%b-%Y %H:%M:%S')}")
+finally:
+    # Idle time counts from the end of the run, however the run ended (st.stop, st.rerun, an error).
+    finish_session()
@@ -0,0 +1,115 @@
+# praga/mock_ai_provider.py
+
+import json
+import os
+import random
+import threading
+import time
+from types import SimpleNamespace
+
+# Filler shaped like the answers the pages expect (headings, questions,
+# bullet lists, file references), so page-level parsing succeeds.
+DEFAULT_RESPONSE_TEXT = (
+    "# Scoring Guide and Rubric\n"
+    "Each item is scored according to the criteria below.\n"
+    "## Knowledge/Comprehension\n"
+    "### Question 1\n"
+    "Explain the Bresenham line algorithm.\n"
+    "#### Correct Answer:\n"
+    "It rasterises a segment using only integer arithmetic.\n"
+    "- Key point: incremental error term\n"
+    "- Key point: no floating point operations\n"
+    "material.pdf (✅)\n"
+)
+
+
+class MockAIClient:
+    """
+    In-process stand-in for g4f's Client with the same
+    `client.chat.completions.create(...)` surface. Latency, failures and
+    streaming speed are configurable per model so the app can be benchmarked
+    and load-tested offline.
+
+    Latency to the first token is drawn from a log-normal distribution with
+    the given median and sigma; the rest of the answer is produced at
+    `tokens_per_second`. A request fails with probability `failure_rate` and
+    returns empty content with probability `empty_rate`.
+    """
+
+    def __init__(self, models=None, latency_median=1.0, latency_sigma=0.5, failure_rate=0.0,
+                 empty_rate=0.0, tokens_per_second=80.0, response_text=DEFAULT_RESPONSE_TEXT,
+                 model_overrides=None, seed=None):
+        self.models = list(models or ["mock-fast", "mock-medium", "mock-slow"])
+        self.defaults = {
+            "latency_median": latency_median,
+            "latency_sigma": latency_sigma,
+            "failure_rate": failure_rate,
+            "empty_rate": empty_rate,
+            "tokens_per_second": tokens_per_second,
+        }
+        self.response_text = response_text
+        self.model_overrides = model_overrides or {}
+        self._random = random.Random(seed)
+        self._random_lock = threading.Lock()
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._create))
+
+    @classmethod
+    def from_env(cls):
+        """Builds a client from the JSON object in the MOCK_AI_CONFIG environment variable, if any."""
+        config = json.loads(os.environ.get("MOCK_AI_CONFIG") or "{}")
+        return cls(**config)
+
+    def list_models(self):
+        return list(self.models)
+
+    def _settings(self, model_name):
+        settings = dict(self.defaults)
+        settings.update(self.model_overrides.get(model_name, {}))
+        return settings
+
+    def _draw(self, settings):
+        """Samples (first_token_latency, outcome) for one request."""
+        with self._random_lock:
+            latency = self._random.lognormvariate(0, settings["latency_sigma"]) * settings["latency_median"]
+            roll = self._random.random()
+        if roll < settings["failure_rate"]:
+            return latency, "error"
+        if roll < settings["failure_rate"] + settings["empty_rate"]:
+            return latency, "empty"
+        return latency, "ok"
+
+    def _answer_words(self, max_tokens):
+        words = self.response_text.replace("\n", " \n ").split(" ")
+        limit = max_tokens or len(words)
+        while len(words) < limit:
+            words += words
+        return words[:limit]
+
+    def _create(self, messages, model=None, stream=False, timeout=None, max_tokens=None, **kwargs):
+        if model not in self.models:
+            raise ValueError(f"Unknown mock model: {model}")
+        settings = self._settings(model)
+        latency, outcome = self._draw(settings)
+
+        if timeout is not None and latency > timeout:
+            time.sleep(timeout)
+            raise TimeoutError(f"Mock model {model} timed out after {timeout}s")
+        time.sleep(latency)
+        if outcome == "error":
+            raise RuntimeError(f"Mock model {model} failed")
+
+        words = [] if outcome == "empty" else self._answer_words(max_tokens)
+        seconds_per_word = 1.0 / settings["tokens_per_second"]
+
+        if stream:
+            return self._stream(words, seconds_per_word)
+
+        time.sleep(len(words) * seconds_per_word)
+        message = SimpleNamespace(role="assistant", content=" ".join(words))
+        return SimpleNamespace(model=model, choices=[SimpleNamespace(index=0, message=message)])
+
+    def _stream(self, words, seconds_per_word):
+        for index, word in enumerate(words):
+            time.sleep(seconds_per_word)
+            delta = SimpleNamespace(content=word if index == 0 else f" {word}")
+            yield SimpleNamespace(choices=[SimpleNamespace(index=0, delta=delta)])
@@ -0,0 +1,137 @@
+# praga/model_router.py
+
+import threading
+import time
+from collections import deque
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class _ModelStats:
+    """Rolling statistics and circuit breaker state for a single model."""
+
+    def __init__(self, window):
+        self.outcomes = deque(maxlen=window)  # (outcome, latency) tuples
+        self.ewma_latency = None
+        self.state = CLOSED
+        self.consecutive_failures = 0
+        self.opened_at = 0.0
+        self.cooldown = 0.0
+        self.trial_started_at = None
+
+    def rate(self, outcome):
+        if not self.outcomes:
+            return 0.0
+        return sum(1 for o, _ in self.outcomes if o == outcome) / len(self.outcomes)
+
+
+class ModelRouter:
+    """
+    Orders candidate models by expected latency and keeps failing models out of
+    the rotation with a circuit breaker.
+
+    A model's breaker opens after `failure_threshold` consecutive failures
+    (errors or empty responses). While open the model is skipped; once the
+    cooldown has elapsed a single request is let through (half-open). Success
+    closes the breaker, failure re-opens it with a doubled cooldown.
+    """
+
+    def __init__(self, window=20, failure_threshold=3, base_cooldown=30.0,
+                 max_cooldown=900.0, prior_latency=15.0, ewma_alpha=0.3):
+        self.window = window
+        self.failure_threshold = failure_threshold
+        self.base_cooldown = base_cooldown
+        self.max_cooldown = max_cooldown
+        self.prior_latency = prior_latency
+        self.ewma_alpha = ewma_alpha
+        self._stats = {}
+        self._lock = threading.Lock()
+
+    def _get(self, model_name):
+        if model_name not in self._stats:
+            self._stats[model_name] = _ModelStats(self.window)
+        return self._stats[model_name]
+
+    def _expected_latency(self, stats):
+        latency = stats.ewma_latency if stats.ewma_latency is not None else self.prior_latency
+        success_rate = 1.0 - stats.rate("error") - stats.rate("empty")
+        # A model that fails half the time costs roughly two attempts per answer.
+        return latency / max(success_rate, 0.1)
+
+    def order(self, model_names):
+        """
+        Returns the models worth trying, fastest expected first.
+        Open breakers are skipped; a model whose cooldown has elapsed is
+        admitted once as a half-open trial after the healthy models.
+        """
+        now = time.monotonic()
+        healthy, trials = [], []
+        with self._lock:
+            for position, name in enumerate(model_names):
+                stats = self._get(name)
+                if stats.state == OPEN and now - stats.opened_at >= stats.cooldown:
+                    stats.state = HALF_OPEN
+                    stats.trial_started_at = None
+                if stats.state == CLOSED:
+                    healthy.append((self._expected_latency(stats), position, name))
+                elif stats.state == HALF_OPEN:
+                    # A granted trial the caller never used (an earlier model answered)
+                    # is handed out again after another cooldown period.
+                    if stats.trial_started_at is None or now - stats.trial_started_at >= self.base_cooldown:
+                        stats.trial_started_at = now
+                        trials.append(name)
+        return [name for _, _, name in sorted(healthy)] + trials
+
+    def timeout_for(self, model_name, default_timeout):
+        """Returns a per-attempt timeout: a few times the model's typical latency, capped by the default."""
+        with self._lock:
+            stats = self._stats.get(model_name)
+            if stats is None or stats.ewma_latency is None:
+                return default_timeout
+            return min(default_timeout, max(30.0, stats.ewma_latency * 4))
+
+    def record_success(self, model_name, latency):
+        with self._lock:
+            stats = self._get(model_name)
+            stats.outcomes.append(("ok", latency))
+            if stats.ewma_latency is None:
+                stats.ewma_latency = latency
+            else:
+                stats.ewma_latency += self.ewma_alpha * (latency - stats.ewma_latency)
+            stats.consecutive_failures = 0
+            stats.state = CLOSED
+            stats.cooldown = 0.0
+            stats.trial_started_at = None
+
+    def record_failure(self, model_name, latency, kind="error"):
+        """Records a failed attempt; `kind` is 'error' or 'empty'."""
+        with self._lock:
+            stats = self._get(model_name)
+            stats.outcomes.append((kind, latency))
+            stats.consecutive_failures += 1
+            if stats.state == HALF_OPEN:
+                stats.cooldown = min(self.max_cooldown, max(self.base_cooldown, stats.cooldown * 2))
+                stats.state = OPEN
+                stats.opened_at = time.monotonic()
+            elif stats.consecutive_failures >= self.failure_threshold:
+                stats.cooldown = self.base_cooldown
+                stats.state = OPEN
+                stats.opened_at = time.monotonic()
+            stats.trial_started_at = None
+
+    def snapshot(self):
+        """Returns a plain-dict view of every tracked model, for display and metrics."""
+        with self._lock:
+            return {
+                name: {
+                    "state": stats.state,
+                    "ewma_latency": stats.ewma_latency,
+                    "error_rate": stats.rate("error"),
+                    "empty_rate": stats.rate("empty"),
+                    "samples": len(stats.outcomes),
+                    "expected_latency": self._expected_latency(stats),
+                }
+                for name, stats in self._stats.items()
+            }
@@ -1,7 +1,152 @@
 # praga/page_chat.py
 
+import threading
+
 import streamlit as st
-from utils import process_direct_with_ai_service, get_curriculum_context
+from utils import (
+    submit_ai_request,
+    is_ai_failure,
+    stream_cancellable,
+    stream_direct_with_ai_service,
+    get_curriculum_context,
+    get_knowledge_base,
+    material_token_budget,
+    track_session
+)
+
+CHAT_SYSTEM_PROMPT = (
+    "You are an AI assistant specialized in answering questions based STRICTLY on the provided text. "
+    "DO NOT use external knowledge. If the answer is not found in the text, state that clearly. "
+    "Each question comes with the excerpts of the course materials most relevant to it; "
+    "cite the excerpts you use by their id in square brackets, e.g. [lecture.pdf#3]. "
+    "Formulate the answers concisely and to the point."
+)
+CHAT_RESPONSE_TOKENS = 1500
+# Materials sent with each question; a cap keeps every turn the same size however large the course is.
+CHAT_CONTEXT_TOKENS = 3000
+# Most recent messages sent verbatim; older ones are folded into the running summary.
+CHAT_RECENT_MESSAGES = 4
+CHAT_SUMMARY_TOKENS = 400
+# The summary is updated in the background once this many messages have left
+# the recent window; until then (or while it runs, or after it fails) they are
+# still sent verbatim, up to twice this many.
+CHAT_SUMMARY_BATCH = 4
+CHAT_SUMMARY_DEADLINE_SECONDS = 60
+
+SUMMARY_SYSTEM_PROMPT = (
+    "You maintain a short running summary of a conversation between a student and a tutor about course materials. "
+    "Keep the questions asked, the key facts of the answers and anything the student said they want. "
+    f"Reply with the updated summary only, in at most {CHAT_SUMMARY_TOKENS // 2} words."
+)
+
+
+def _reset_chat():
+    job = st.session_state.pop("chat_summary_job", None)
+    if job is not None:
+        job[2].set()
+    st.session_state.chat_history = []
+    st.session_state.chat_summary = ""
+    st.session_state.chat_summarized_upto = 0
+    st.session_state.chat_materials = get_knowledge_base().version
+
+
+def _retrieval_query(history):
+    """The latest question, plus the one before it so short follow-ups still find their topic."""
+    questions = [msg["content"] for msg in history if msg["role"] == "user"]
+    return "\n".join(questions[-2:])
+
+
+def _answered(messages):
+    """
+    Drops failed replies (kept in the history, flagged, so the user sees
+    them) together with the questions they were answering, so neither is
+    sent back to the model or summarised.
+    """
+    kept = []
+    for msg in messages:
+        if msg.get("failed"):
+            if kept and kept[-1]["role"] == "user":
+                kept.pop()
+            continue
+        kept.append(msg)
+    return kept
+
+
+def _build_turn_messages(history):
+    """
+    Returns the messages for answering the last question in `history`: the
+    fixed system prompt with the running summary, the turns the summary does
+    not cover yet, and the question with the excerpts retrieved for it.
+    """
+    system_prompt = CHAT_SYSTEM_PROMPT
+    if st.session_state.chat_summary:
+        system_prompt += f"\n\nSummary of the earlier conversation:\n{st.session_state.chat_summary}"
+    end = len(history) - 1
+    start = max(st.session_state.chat_summarized_upto, end - CHAT_RECENT_MESSAGES - 2 * CHAT_SUMMARY_BATCH)
+    recent = _answered(history[max(min(start, end - CHAT_RECENT_MESSAGES), 0):end])
+    question = history[-1]["content"]
+
+    prompt_text = system_prompt + question + "".join(msg["content"] for msg in recent)
+    budget = min(CHAT_CONTEXT_TOKENS, material_token_budget(CHAT_RESPONSE_TOKENS, prompt_text))
+    context, _ = get_curriculum_context(_retrieval_query(history), budget)
+    turn = (
+        "--- START PROVIDED MATERIALS ---\n"
+        f"{context}\n"
+        "--- END PROVIDED MATERIALS ---\n\n"
+        f"Question: {question}"
+    )
+    return [{"role": "system", "content": system_prompt}] + recent + [{"role": "user", "content": turn}]
+
+
+def _start_summary(ai_client):
+    """
+    Starts folding the messages that have left the recent window into the
+    running summary, in the background, once a batch of them has built up.
+    """
+    if st.session_state.get("chat_summary_job") is not None:
+        return
+    history = st.session_state.chat_history
+    upto = max(len(history) - CHAT_RECENT_MESSAGES, 0)
+    start = st.session_state.chat_summarized_upto
+    if upto - start < CHAT_SUMMARY_BATCH:
+        return
+    messages = _answered(history[start:upto])
+    if not messages:
+        st.session_state.chat_summarized_upto = upto
+        return
+    transcript = "\n".join(f"{msg['role'].capitalize()}: {msg['content']}" for msg in messages)
+    user_prompt = (
+        f"Current summary:\n{st.session_state.chat_summary or '(empty)'}\n\n"
+        f"New messages:\n{transcript}"
+    )
+    cancel_event = threading.Event()
+    future = submit_ai_request(
+        user_prompt, SUMMARY_SYSTEM_PROMPT, ai_client,
+        {"max_tokens": CHAT_SUMMARY_TOKENS, "temp": 0.3},
+        deadline=CHAT_SUMMARY_DEADLINE_SECONDS, cancel_event=cancel_event
+    )
+    st.session_state.chat_summary_job = (upto, future, cancel_event)
+
+
+def _collect_summary():
+    """Applies the background summary if it has finished; never waits for it."""
+    job = st.session_state.get("chat_summary_job")
+    if job is None or not job[1].done():
+        return
+    del st.session_state["chat_summary_job"]
+    upto, future, _ = job
+    try:
+        summary = future.result()
+    except Exception as e:
+        summary = None
+        print(f"Chat summary failed: {e}")
+    if is_ai_failure(summary):
+        # The messages stay unsummarized and are sent verbatim; the next turn tries again.
+        print(f"Chat summary not updated: {summary}")
+        return
+    st.session_state.chat_summary = summary.strip()
+    st.session_state.chat_summarized_upto = upto
+
 
 def render_page(ai_client):
     st.header("💬 AI Chat Based on Materials")
@@ -10,47 +155,56 @@ def render_page(ai_client):
         st.error("AI service is not available for chat.")
         st.stop()
 
-    context, num_files = get_curriculum_context()
-
-    if context:
-        st.info(f"🤖 The chat will respond **exclusively** based on the content of the **{num_files}** processed files.")
-        system_prompt = (
-            "You are an AI assistant specialized in answering questions based STRICTLY on the provided text. "
-            "DO NOT use external knowledge. If the answer is not found in the text, state that clearly. "
-            "Formulate the answers concisely and to the point, based on the following materials:\n\n"
-            "--- START PROVIDED MATERIALS ---\n"
-            f"{context}\n"
-            "--- END PROVIDED MATERIALS ---"
-        )
-    else:
+    if not st.session_state.get("processed_data"):
         # This check is now redundant due to the main.py guard, but good for safety.
         st.error("The knowledge base is not loaded. Please process a folder in the upload module.")
         st.stop()
 
-    if 'chat_history' not in st.session_state or st.session_state.chat_history[0]['content'] != system_prompt:
-        st.session_state.chat_history = [{"role": "system", "content": system_prompt}]
+    num_files = len(st.session_state.processed_data)
+    st.info(f"🤖 The chat will respond **exclusively** based on the content of the **{num_files}** processed files.")
+
+    # Start over when a different set of materials is loaded.
+    if 'chat_history' not in st.session_state or st.session_state.get("chat_materials") != get_knowledge_base().version:
+        _reset_chat()
+    _collect_summary()
 
     chat_container = st.container(height=500, border=False)
     with chat_container:
         for msg in st.session_state.chat_history:
-            if msg["role"] == "user":
-                st.chat_message("user").write(msg["content"])
-            elif msg["role"] == "assistant":
-                st.chat_message("assistant").write(msg["content"])
+            if msg.get("failed"):
+                st.chat_message(msg["role"]).error(msg["content"])
+            else:
+                st.chat_message(msg["role"]).write(msg["content"])
 
     if user_input := st.chat_input("Ask a question about the uploaded materials..."):
         st.session_state.chat_history.append({"role": "user", "content": user_input})
         st.rerun()
 
-    if st.session_state.chat_history[-1]["role"] == "user":
-        with st.spinner("The AI is thinking..."):
-            max_history_pairs = 5
-            # Ensure the system prompt is always the first message
-            messages_for_api = [st.session_state.chat_history[0]] + st.session_state.chat_history[-(2 * max_history_pairs):]
-            
-            ai_response = process_direct_with_ai_service(
-                None, None, ai_client,
-                {"messages_override": messages_for_api, "max_tokens": 1500, "temp": 0.7}
-            )
-            st.session_state.chat_history.append({"role": "assistant", "content": ai_response})
-            st.rerun()
\ No newline at end of file
+    if st.session_state.chat_history and st.session_state.chat_history[-1]["role"] == "user":
+        messages_for_api = _build_turn_messages(st.session_state.chat_history)
+
+        def cancel_pending_question():
+            # Callbacks run before main.py restores a spilled session.
+            track_session()
+            # Drop the unanswered question so the rerun does not ask it again.
+            if st.session_state.chat_history[-1]["role"] == "user":
+                st.session_state.chat_history.pop()
+
+        with chat_container:
+            st.button("✖️ Cancel", key="cancel_chat_response", on_click=cancel_pending_question)
+            answer = st.chat_message("assistant")
+            with answer:
+                # Nothing may run between starting the call and reading it, or a rerun there would leave it running.
+                reply = stream_cancellable(
+                    "Waiting for the answer", stream_direct_with_ai_service,
+                    None, None, ai_client,
+                    {"messages_override": messages_for_api, "max_tokens": CHAT_RESPONSE_TOKENS, "temp": 0.7},
+                    hedge=True
+                )
+                ai_response = st.write_stream(reply)
+        message = {"role": "assistant", "content": ai_response}
+        if reply.failed:
+            message["failed"] = True
+        st.session_state.chat_history.append(message)
+        _start_summary(ai_client)
+        st.rerun()
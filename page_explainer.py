@@ -3,7 +3,11 @@
 import streamlit as st
 from utils import (
     process_direct_with_ai_service,
+    stream_direct_with_ai_service,
+    stream_cancellable,
+    run_cancellable,
     get_curriculum_context,
+    material_token_budget,
     create_document_word,
     create_presentation_from_text
 )
@@ -50,24 +54,37 @@ def render_page(ai_client):
             st.session_state.presentation_text = None
             st.session_state.last_explained_topic = explainer_topic
 
-            max_context_length = 25000
-            if len(context) > max_context_length:
-                context = context[:max_context_length] + "\n\n[CONTEXT TRUNCATED]"
-
             system_prompt = (
                 "You are an expert pedagogue. Your task is to explain the given topic based STRICTLY on the provided text. Adapt the explanation for the specified audience, length, and style. Structure the response logically, using Markdown formatting."
             )
-            user_prompt = (
+            user_prompt_header = (
                 f"Please explain the topic: '{explainer_topic}'.\n"
                 f"Adapt the explanation for a '{explainer_audience}', make it '{explainer_length}' in length, and use a '{explainer_style}' teaching style.\n\n"
+            )
+            context, _ = get_curriculum_context(
+                explainer_topic, material_token_budget(2000, system_prompt + user_prompt_header)
+            )
+            user_prompt = (
+                f"{user_prompt_header}"
                 f"--- START PROVIDED MATERIALS ---\n{context}\n--- END PROVIDED MATERIALS ---"
             )
 
-            with st.spinner(f"The AI is constructing an explanation for '{explainer_topic}'..."):
-                explanation = process_direct_with_ai_service(
+            # Stream the explanation as it is written; the regular view below replaces it once complete.
+            stream_placeholder = st.empty()
+            with stream_placeholder.container():
+                # Clicking reruns the page, which stops reading the stream and cancels the call.
+                st.button("✖️ Cancel", key="cancel_explanation")
+                reply = stream_cancellable(
+                    "Writing the explanation", stream_direct_with_ai_service,
                     user_prompt, system_prompt, ai_client,
-                    {"max_tokens": 2000, "temp": 0.7}
+                    {"max_tokens": 2000, "temp": 0.7},
+                    hedge=True
                 )
+                explanation = st.write_stream(reply)
+            stream_placeholder.empty()
+            if reply.failed:
+                st.error(explanation)
+            else:
                 st.session_state.explanation_text = explanation
         else:
             st.warning("Please enter a topic to be explained.")
@@ -119,7 +136,10 @@ Explanatory paragraph 2 (optional).
 
 Text to convert: '''{st.session_state.explanation_text}'''
                 """
-                presentation_text_response = process_direct_with_ai_service(user_prompt_ppt, system_prompt_ppt, ai_client, {"max_tokens": 3000})
+                presentation_text_response = run_cancellable(
+                    "Structuring the presentation", process_direct_with_ai_service,
+                    user_prompt_ppt, system_prompt_ppt, ai_client, {"max_tokens": 3000}
+                )
                 if presentation_text_response and "Error" not in presentation_text_response:
                     st.session_state.presentation_text = presentation_text_response
                     st.success("Presentation structure generated!")
@@ -5,8 +5,13 @@ import pandas as pd
 import json
 from utils import (
     process_direct_with_ai_service,
+    process_many_with_ai_service,
+    run_cancellable,
     format_cell_for_custom_display,
     get_curriculum_context,
+    get_knowledge_base,
+    pack_curriculum_context,
+    material_token_budget,
     DEFAULT_COMPETENCIES_SPECIFIC,
     MATERIAL_CATEGORIES,
     COVERAGE_LEGEND_EN_KEYS_FOR_AI,
@@ -31,7 +36,8 @@ def generate_analysis_report(ai_client, analysis_df, competencies_dict):
         f"--- ANALYSIS DATA ---\n{analysis_text_for_ai}\n--- END DATA ---"
     )
     with st.spinner("The AI pedagogical expert is writing the report..."):
-        report_content = process_direct_with_ai_service(
+        report_content = run_cancellable(
+            "Writing the report", process_direct_with_ai_service,
             user_prompt, system_prompt, ai_client, {"max_tokens": 4000, "temp": 0.6}
         )
     if "Error" in report_content:
@@ -62,13 +68,15 @@ def render_page(ai_client):
 
     if st.button("🤖 Generate Competencies from Materials (AI)"):
         with st.spinner("The AI is analyzing the materials to suggest competencies..."):
-            max_context = 20000
-            truncated_context = context[:max_context] + "..." if len(context) > max_context else context
-            
             system_prompt_comp = "You are an expert in pedagogy. Analyze the educational text and formulate a list of 8-10 key competencies. Respond ONLY with the list, each competency on a new line, in the format 'CX: Description'."
-            user_prompt_comp = f"Based on the following text extracted from didactic materials, identify and list the main specific competencies:\n\n{truncated_context}"
+            user_prompt_intro = "Based on the following text extracted from didactic materials, identify and list the main specific competencies:\n\n"
+            packed_context = pack_curriculum_context(material_token_budget(1000, system_prompt_comp + user_prompt_intro))
+            user_prompt_comp = f"{user_prompt_intro}{packed_context}"
             
-            ai_competencies = process_direct_with_ai_service(user_prompt_comp, system_prompt_comp, ai_client, {"max_tokens": 1000})
+            ai_competencies = run_cancellable(
+                "Suggesting competencies", process_direct_with_ai_service,
+                user_prompt_comp, system_prompt_comp, ai_client, {"max_tokens": 1000}
+            )
             
             if ai_competencies and "Error" not in ai_competencies:
                 st.session_state.competencies_text_for_manual_edit = ai_competencies
@@ -118,29 +126,37 @@ def render_page(ai_client):
         progress_bar = st.progress(0, text=f"AI analysis in progress... 0/{total_cells} cells processed.")
         
         files_summary_prompt_part = "\n".join(
-            [f"- File: '{name}', Content summary: {content[:200]}..." for name, content in files_data.items()]
+            [f"- File: '{name}', Content summary: {summary}..." for name, summary in get_knowledge_base().file_summaries.items()]
         )
         
-        cells_processed = 0
+        cells = []
+        cell_requests = []
+        system_prompt_cell = "You are an AI assistant focused on a single task: analyze if the provided files match a specific competency AND a material category. Be optimistic."
         for comp_id, comp_desc in st.session_state.competencies_dict.items():
             for category in MATERIAL_CATEGORIES:
-                system_prompt_cell = "You are an AI assistant focused on a single task: analyze if the provided files match a specific competency AND a material category. Be optimistic."
                 user_prompt_cell = (
                     f"Do any of the files below match the category **'{category}'** AND cover the competency **'{comp_id}: {comp_desc}'**?\n\n"
                     f"AVAILABLE FILES:\n{files_summary_prompt_part}\n\n"
                     f"Respond ONLY with the names of the relevant files, followed by (✅) for complete coverage or (🤔) for partial. Separate them by comma. If none match, respond ONLY with 'Missing'."
                 )
+                cells.append((comp_id, category))
+                cell_requests.append({
+                    "user_input_text": user_prompt_cell,
+                    "system_prompt": system_prompt_cell,
+                    "generation_params": {"max_tokens": 500, "temp": 0.1},
+                })
 
-                ai_response = process_direct_with_ai_service(
-                    user_prompt_cell, system_prompt_cell, ai_client,
-                    {"max_tokens": 500, "temp": 0.1}
-                )
+        # Clicking reruns the page; the next progress update then stops the batch.
+        st.button("✖️ Cancel analysis", key="cancel_analysis")
+
+        def update_progress(cells_processed, total):
+            progress_bar.progress(cells_processed / total, text=f"AI analysis... {cells_processed}/{total} cells.")
+
+        ai_responses = process_many_with_ai_service(cell_requests, ai_client, progress_callback=update_progress)
 
-                if ai_response and "Error" not in ai_response and "Missing" not in ai_response:
-                    analysis_df_in_progress.loc[comp_id, category] = ai_response
-                
-                cells_processed += 1
-                progress_bar.progress(cells_processed / total_cells, text=f"AI analysis... {cells_processed}/{total_cells} cells. (Comp: {comp_id})")
+        for (comp_id, category), ai_response in zip(cells, ai_responses):
+            if ai_response and "Error" not in ai_response and "Missing" not in ai_response:
+                analysis_df_in_progress.loc[comp_id, category] = ai_response
 
         st.session_state.analysis_df = analysis_df_in_progress
         progress_bar.empty()
@@ -149,7 +165,7 @@ def render_page(ai_client):
 
     if st.session_state.analysis_df is not None:
         st.subheader("Step 3: Analysis Results")
-        df_display = st.session_state.analysis_df.applymap(format_cell_for_custom_display)
+        df_display = st.session_state.analysis_df.map(format_cell_for_custom_display)
         st.markdown(df_display.to_html(escape=False), unsafe_allow_html=True)
         st.markdown("---")
         
@@ -2,7 +2,12 @@
 
 import streamlit as st
 import os
-from utils import extract_text_from_file
+from utils import extract_documents_from_files, get_knowledge_base, load_documents_into_session
+
+PDF_MODES = {
+    "⚡ Fast (plain text)": "pdfium",
+    "🔍 High fidelity (layout analysis, slower)": "pdfplumber",
+}
 
 def render_page(ai_client):
     st.header("📚 Upload & Process Didactic Materials")
@@ -19,26 +24,40 @@ def render_page(ai_client):
         key="material_uploader"
     )
 
+    pdf_mode = st.radio(
+        "PDF text extraction",
+        list(PDF_MODES),
+        horizontal=True,
+        key="pdf_extraction_mode",
+        help="The fast mode reads the PDF's text layer directly. Use high fidelity for multi-column or table-heavy PDFs whose text comes out in the wrong order."
+    )
+    collapse_duplicates = st.checkbox(
+        "Skip near-duplicate files",
+        value=True,
+        key="collapse_duplicates",
+        help="Files with almost the same content (e.g. the same lecture as PDF and PPTX, or several revisions of a worksheet) are kept only once, in their most complete version, so every AI request is smaller."
+    )
+
     if st.button("🚀 Process Uploaded Materials", type="primary"):
         if uploaded_files:
-            extracted_data = {}
             progress_bar = st.progress(0, text="Extracting text from files...")
 
-            for i, file in enumerate(uploaded_files):
-                progress_bar.progress((i + 1) / len(uploaded_files), text=f"Processing: {file.name}")
-                text = extract_text_from_file(file)
-                if text:
-                    extracted_data[file.name] = text
+            def update_progress(completed, total, file_name):
+                progress_bar.progress(completed / total, text=f"Processed {completed}/{total}: {file_name}")
+
+            documents = extract_documents_from_files(
+                uploaded_files, progress_callback=update_progress, pdf_backend=PDF_MODES[pdf_mode]
+            )
 
-            if not extracted_data:
+            if not documents:
                 st.error("Could not extract text from any of the provided files.")
                 st.stop()
             
             # Store extracted data in the session state for multi-client support
-            st.session_state.processed_data = extracted_data
+            load_documents_into_session(documents, collapse_duplicates=collapse_duplicates)
             
             progress_bar.empty()
-            st.success(f"Extracted content from {len(extracted_data)} files and saved the knowledge base for this session.")
+            st.success(f"Extracted content from {len(documents)} files and saved the knowledge base for this session.")
             st.rerun()
 
         else:
@@ -49,10 +68,21 @@ def render_page(ai_client):
     st.subheader("Knowledge Base Status")
     if 'processed_data' in st.session_state and st.session_state.processed_data:
         st.success(f"✅ Knowledge base for this session has been successfully loaded.")
+        knowledge_base = get_knowledge_base()
+        st.caption(f"Version `{knowledge_base.version}` · ~{knowledge_base.total_tokens:,} tokens")
         with st.expander("Show processed files"):
             data = st.session_state.processed_data
             st.write(f"**{len(data)}** files have been processed:")
             file_list_md = "\n".join([f"- `{file}`" for file in data.keys()])
             st.markdown(file_list_md)
+
+        duplicates = st.session_state.get('duplicate_files') or {}
+        if duplicates:
+            action = "skipped" if st.session_state.get('duplicates_collapsed') else "kept, but flagged"
+            with st.expander(f"Near-duplicate files ({len(duplicates)} {action})"):
+                st.markdown("\n".join(
+                    f"- `{name}` ≈ `{kept}` ({similarity:.0%} similar)"
+                    for name, (kept, similarity) in duplicates.items()
+                ))
     else:
         st.warning("❌ No knowledge base is loaded for this session. Please upload and process materials.")
\ No newline at end of file
@@ -6,10 +6,18 @@ import re
 from utils import (
     process_direct_with_ai_service,
     get_curriculum_context,
+    material_token_budget,
+    pack_curriculum_context,
+    rank_files,
     create_document_word,
     extract_text_from_file,
+    run_cancellable,
+    track_session,
 )
 
+# Files whose whole content may be used for a quiz, best-matching first.
+QUIZ_MAX_FILES = 5
+
 def create_student_version_from_teacher_version(teacher_text):
     """
     Processes the teacher's version text and removes the scoring guide and answers
@@ -45,6 +53,8 @@ def render_page(ai_client):
         st.stop()
     
     def clear_barem_state():
+        # Callbacks run before main.py restores a spilled session.
+        track_session()
         keys_to_delete = ['generated_barem', 'source_test_filename']
         for key in keys_to_delete:
             if key in st.session_state:
@@ -83,22 +93,15 @@ def render_page(ai_client):
                 st.warning("Please enter the topic and select at least one question.")
             else:
                 with st.spinner("Step 1/2: Identifying relevant materials..."):
-                    all_files_data = st.session_state.get('processed_data', {})
-                    
-                    file_list_str = ", ".join(all_files_data.keys())
-                    filter_prompt = f"From the list: {file_list_str}, which files are most relevant to the topic '{quiz_topic}'? Respond ONLY with a comma-separated list of filenames."
-                    relevant_files_str = process_direct_with_ai_service(filter_prompt, "You are a library assistant.", ai_client, {"max_tokens": 500})
-                    
-                    focused_context = ""
-                    if relevant_files_str and "Error" not in relevant_files_str:
-                        relevant_files = [f.strip().strip("'\"") for f in relevant_files_str.split(',')]
-                        for file_name in relevant_files:
-                            if file_name in all_files_data:
-                                focused_context += f"--- Content from '{file_name}' ---\n{all_files_data[file_name]}\n\n"
-                    
-                    if not focused_context:
-                        st.warning("Filtering failed, using the full context.")
-                        focused_context = context
+                    # Ranked locally, so the same topic always selects the same materials.
+                    token_budget = material_token_budget(4000)
+                    relevant_files = [name for name, _ in rank_files(quiz_topic, QUIZ_MAX_FILES)]
+                    if relevant_files:
+                        focused_context = pack_curriculum_context(token_budget, files=relevant_files)
+                        st.caption("Materials used: " + ", ".join(relevant_files))
+                    else:
+                        st.info("No file mentions the topic directly, using the passages closest to it.")
+                        focused_context, _ = get_curriculum_context(quiz_topic, token_budget)
 
                 with st.spinner(f"Step 2/2: Generating the quiz from relevant materials..."):
                     system_prompt = (
@@ -115,8 +118,10 @@ def render_page(ai_client):
                         f"Structure: {num_knowledge} Knowledge items, {num_application} Application/Analysis items, {num_synthesis} Synthesis/Evaluation items."
                     )
                     
-                    teacher_version_raw = process_direct_with_ai_service(
-                        user_prompt, system_prompt, ai_client, {"max_tokens": 4000, "temp": 0.7}
+                    teacher_version_raw = run_cancellable(
+                        "Writing the quiz", process_direct_with_ai_service,
+                        user_prompt, system_prompt, ai_client, {"max_tokens": 4000, "temp": 0.7},
+                        use_cache=False  # every click should produce a new quiz variant
                     )
 
                 if teacher_version_raw and "Error" not in teacher_version_raw and "Question" in teacher_version_raw:
@@ -172,7 +177,10 @@ def render_page(ai_client):
                         f"--- TEST TEXT ---\n{test_text}\n--- END TEXT ---"
                     )
                     with st.spinner("The assessment expert is building the guide..."):
-                        barem_content = process_direct_with_ai_service(user_prompt, system_prompt, ai_client)
+                        barem_content = run_cancellable(
+                            "Building the guide", process_direct_with_ai_service,
+                            user_prompt, system_prompt, ai_client
+                        )
                     
                     st.session_state.generated_barem = barem_content
                     st.session_state.source_test_filename = uploaded_test_file.name
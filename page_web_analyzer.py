@@ -9,10 +9,14 @@ import uuid
 from pydub import AudioSegment
 import speech_recognition as sr
 
+from context_packer import pack_text
 from utils import (
     process_direct_with_ai_service,
     get_curriculum_context,
-    create_document_word
+    material_token_budget,
+    pack_curriculum_context,
+    create_document_word,
+    run_cancellable
 )
 
 def download_audio_from_youtube(url, output_path):
@@ -103,9 +107,8 @@ def render_page(ai_client):
         with st.expander("Show extracted text", expanded=False):
             st.text_area("Extracted Text", st.session_state.extracted_content, height=250)
             
-        content_for_ai = st.session_state.extracted_content
-        if len(content_for_ai) > 18000:
-            content_for_ai = content_for_ai[:18000] + " [TRUNCATED CONTEXT]"
+        # Leave room for the curriculum, which shares the prompt in the comparison below.
+        content_for_ai = pack_text(st.session_state.extracted_content, material_token_budget(4000) // 2)
 
         with st.container(border=True):
             st.subheader("1. Generate Summary")
@@ -114,7 +117,7 @@ def render_page(ai_client):
                 with st.spinner("The AI is generating the summary..."):
                     system_prompt = "You are an AI assistant expert in synthesizing information."
                     user_prompt = f"Generate a '{summary_complexity}' type summary for the following text:\n\n{content_for_ai}"
-                    summary = process_direct_with_ai_service(user_prompt, system_prompt, ai_client)
+                    summary = run_cancellable("Summarising", process_direct_with_ai_service, user_prompt, system_prompt, ai_client)
                     st.session_state.generated_summary = summary
             if 'generated_summary' in st.session_state:
                 st.markdown(st.session_state.generated_summary)
@@ -129,6 +132,8 @@ def render_page(ai_client):
                 if st.button("🔬 Analyze vs. Curriculum", key="analyze_vs_curriculum", type="primary"):
                     with st.spinner("The AI is comparing the resource with the curriculum..."):
                         system_prompt = "You are an expert in curriculum design. Analyze an external resource (Context 2) in relation to a given curriculum (Context 1) and produce an analysis report."
+                        curriculum_budget = material_token_budget(4000, system_prompt + content_for_ai)
+                        curriculum_context = pack_curriculum_context(curriculum_budget)
                         user_prompt = (
                             "Analyze how 'Context 2' aligns with 'Context 1'. The report must contain:\n"
                             "1. **Covered Competencies:** Which curriculum competencies are covered by the resource?\n"
@@ -137,7 +142,10 @@ def render_page(ai_client):
                             f"--- CONTEXT 1: CURRICULUM ---\n{curriculum_context}\n\n"
                             f"--- CONTEXT 2: EXTERNAL RESOURCE ---\n{content_for_ai}"
                         )
-                        analysis_report = process_direct_with_ai_service(user_prompt, system_prompt, ai_client, {"max_tokens": 4000})
+                        analysis_report = run_cancellable(
+                            "Comparing with the curriculum", process_direct_with_ai_service,
+                            user_prompt, system_prompt, ai_client, {"max_tokens": 4000}
+                        )
                         st.session_state.curriculum_analysis_report = analysis_report
             else:
                 st.warning("The curriculum is not loaded.")
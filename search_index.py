@@ -0,0 +1,76 @@
+# praga/search_index.py
+
+import re
+import unicodedata
+from collections import Counter, defaultdict
+
+import numpy as np
+
+_TOKEN = re.compile(r"\w+", re.UNICODE)
+
+
+def tokenize(text):
+    """
+    Lower-cases, strips diacritics (so "transformări" matches
+    "transformari") and splits into word tokens of two or more characters.
+    """
+    folded = unicodedata.normalize("NFKD", text.lower())
+    folded = "".join(ch for ch in folded if not unicodedata.combining(ch))
+    return [token for token in _TOKEN.findall(folded) if len(token) > 1]
+
+
+class BM25Index:
+    """
+    Okapi BM25 over a list of texts, held as an inverted index of NumPy
+    posting arrays so a query only touches the documents containing its
+    terms.
+    """
+
+    def __init__(self, texts, k1=1.5, b=0.75):
+        self.k1 = k1
+        self.b = b
+        postings = defaultdict(lambda: ([], []))
+        lengths = []
+        for doc_id, text in enumerate(texts):
+            counts = Counter(tokenize(text))
+            lengths.append(sum(counts.values()))
+            for term, tf in counts.items():
+                docs, freqs = postings[term]
+                docs.append(doc_id)
+                freqs.append(tf)
+
+        self.size = len(lengths)
+        self.lengths = np.asarray(lengths, dtype=np.float32)
+        avg_length = float(self.lengths.mean()) if self.size and self.lengths.mean() > 0 else 1.0
+        # Per-document part of the BM25 denominator, precomputed once.
+        self._norm = k1 * (1 - b + b * self.lengths / avg_length)
+        self.postings = {
+            term: (np.asarray(docs, dtype=np.int32), np.asarray(freqs, dtype=np.float32))
+            for term, (docs, freqs) in postings.items()
+        }
+        self.idf = {
+            term: float(np.log(1 + (self.size - len(docs) + 0.5) / (len(docs) + 0.5)))
+            for term, (docs, _) in self.postings.items()
+        }
+
+    def __len__(self):
+        return self.size
+
+    def scores(self, query):
+        """Returns the BM25 score of every document for `query`."""
+        scores = np.zeros(self.size, dtype=np.float32)
+        for term in set(tokenize(query)):
+            if term not in self.postings:
+                continue
+            docs, freqs = self.postings[term]
+            scores[docs] += self.idf[term] * freqs * (self.k1 + 1) / (freqs + self._norm[docs])
+        return scores
+
+    def top(self, query, limit=None):
+        """Returns [(doc_id, score)] for documents matching `query`, best first."""
+        scores = self.scores(query)
+        matching = np.flatnonzero(scores > 0)
+        if limit is not None and len(matching) > limit:
+            matching = matching[np.argpartition(-scores[matching], limit - 1)[:limit]]
+        ranked = matching[np.lexsort((matching, -scores[matching]))]
+        return [(int(doc_id), float(scores[doc_id])) for doc_id in ranked]
@@ -0,0 +1,283 @@
+# praga/session_memory.py
+
+import io
+import os
+import pickle
+import shutil
+import sys
+import threading
+import time
+from types import MappingProxyType
+
+import numpy as np
+import pandas as pd
+
+from shared_store import KnowledgeBaseHandle
+
+IDLE_SESSION_SECONDS = 10 * 60
+SWEEP_INTERVAL_SECONDS = 60
+# Values smaller than this stay in memory; writing them out saves too little.
+SPILL_MIN_BYTES = 256 * 1024
+# Session keys holding generated artifacts, which pages only read and replace
+# whole, so they can be written out and read back unchanged. Widget values
+# are never spilled.
+SPILLABLE_KEYS = (
+    "processed_data", "document_layouts", "duplicate_files",
+    "chat_history", "analysis_df", "generated_report_text",
+    "explanation_text", "presentation_text",
+    "teacher_version", "student_version", "generated_barem",
+    "extracted_content", "generated_summary", "curriculum_analysis_report",
+)
+# Where a spilled session remembers which shared knowledge base it had loaded.
+SPILLED_KNOWLEDGE_BASE_KEY = "_spilled_knowledge_base"
+
+
+def is_shared(value):
+    """True for views of the process-wide knowledge bases, which no single session owns."""
+    if isinstance(value, tuple):
+        return any(isinstance(item, KnowledgeBaseHandle) for item in value)
+    return isinstance(value, (MappingProxyType, KnowledgeBaseHandle))
+
+
+def approximate_size(value, _seen=None):
+    """
+    Approximate deep size of a session value in bytes. Containers, strings,
+    arrays, data frames and buffers are measured through; other objects
+    (clients, handles) count only their own size, and objects reached twice
+    are counted once.
+    """
+    seen = set() if _seen is None else _seen
+    if id(value) in seen:
+        return 0
+    seen.add(id(value))
+    if isinstance(value, pd.DataFrame):
+        return int(value.memory_usage(deep=True).sum())
+    if isinstance(value, np.ndarray):
+        return value.nbytes
+    if isinstance(value, io.BytesIO):
+        return sys.getsizeof(value) + value.getbuffer().nbytes
+    size = sys.getsizeof(value)
+    if isinstance(value, (dict, MappingProxyType)):
+        size += sum(approximate_size(k, seen) + approximate_size(v, seen) for k, v in value.items())
+    elif isinstance(value, (list, tuple, set, frozenset)):
+        size += sum(approximate_size(item, seen) for item in value)
+    return size
+
+
+def session_memory_report(state):
+    """
+    Returns [(key, bytes, shared)] for a session's state, largest first.
+    Shared values (views of the process-wide knowledge bases) are listed
+    with 0 bytes, since they cost the session nothing of its own.
+    """
+    rows = []
+    seen = set()
+    for key, value in state.items():
+        shared = is_shared(value)
+        rows.append((key, 0 if shared else approximate_size(value, seen), shared))
+    rows.sort(key=lambda row: (-row[1], row[0]))
+    return rows
+
+
+class SpilledValue:
+    """Stands in for a session value that was written to disk."""
+
+    __slots__ = ("path", "size")
+
+    def __init__(self, path, size):
+        self.path = path
+        self.size = size
+
+    def __repr__(self):
+        return f"SpilledValue({os.path.basename(self.path)!r}, {self.size} bytes)"
+
+
+class _Session:
+    __slots__ = ("state", "last_active", "running", "lock", "spilled", "spilled_bytes")
+
+    def __init__(self, state):
+        self.state = state
+        self.last_active = time.time()
+        self.running = False
+        self.lock = threading.Lock()
+        self.spilled = False
+        self.spilled_bytes = 0
+
+
+class SessionMemoryManager:
+    """
+    Process-wide registry of sessions that writes the large artifacts of
+    idle sessions to `spill_dir` and reads them back when the session is
+    used again.
+
+    Each script run calls touch() first and finish() when it ends, however
+    it ends; widget callbacks that read spillable values call touch() too,
+    since they run before the script. touch() marks the session running and
+    restores anything spilled. sweep() runs periodically (see start()). It
+    spills the SPILLABLE_KEYS values of at least `min_bytes` from sessions
+    whose last run finished `idle_seconds` ago and that are not running. It
+    also releases their handle on the shared knowledge base, so
+    `knowledge_bases` (a SharedKnowledgeBaseStore) can evict it in turn.
+    Sessions the runtime no longer holds at all are forgotten, together
+    with their files; disconnected sessions the browser may reconnect to are
+    kept.
+    """
+
+    def __init__(self, spill_dir, knowledge_bases=None, idle_seconds=IDLE_SESSION_SECONDS, min_bytes=SPILL_MIN_BYTES):
+        self.spill_dir = spill_dir
+        self.knowledge_bases = knowledge_bases
+        self.idle_seconds = idle_seconds
+        self.min_bytes = min_bytes
+        self._lock = threading.Lock()
+        self._sessions = {}
+        # Files left by an earlier process belong to sessions that no longer exist.
+        shutil.rmtree(spill_dir, ignore_errors=True)
+        os.makedirs(spill_dir, exist_ok=True)
+
+    def touch(self, session_id, state):
+        """Marks a session running and restores its spilled values. Call at the start of every script run."""
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is None:
+                session = self._sessions[session_id] = _Session(state)
+        with session.lock:
+            session.state = state
+            session.running = True
+            session.last_active = time.time()
+            # The state is checked too: a session forgotten by the registry may still hold spilled values.
+            if session.spilled or self._has_spilled(state):
+                self._rehydrate(session_id, session)
+
+    def finish(self, session_id):
+        """Marks the end of a script run; the session's idle time counts from here."""
+        with self._lock:
+            session = self._sessions.get(session_id)
+        if session is not None:
+            with session.lock:
+                session.running = False
+                session.last_active = time.time()
+
+    def sweep(self, is_known=None):
+        """
+        Spills idle sessions; forgets sessions for which is_known(session_id)
+        is False, i.e. sessions the runtime has dropped, not merely disconnected.
+        """
+        now = time.time()
+        with self._lock:
+            sessions = list(self._sessions.items())
+        for session_id, session in sessions:
+            if is_known is not None and not is_known(session_id):
+                with self._lock:
+                    self._sessions.pop(session_id, None)
+                shutil.rmtree(self._session_dir(session_id), ignore_errors=True)
+                continue
+            with session.lock:
+                if not session.running and not session.spilled and now - session.last_active >= self.idle_seconds:
+                    self._spill(session_id, session)
+
+    def start(self, is_known=None, interval=SWEEP_INTERVAL_SECONDS):
+        """Runs sweep() every `interval` seconds on a daemon thread."""
+        def loop():
+            while True:
+                time.sleep(interval)
+                try:
+                    self.sweep(is_known)
+                except Exception as e:
+                    print(f"Session memory sweep failed: {e}")
+        threading.Thread(target=loop, name="session-memory-sweeper", daemon=True).start()
+
+    def stats(self):
+        """Returns [{session, running, idle_seconds, bytes, spilled_bytes}] for the registered sessions."""
+        now = time.time()
+        with self._lock:
+            sessions = list(self._sessions.items())
+        rows = []
+        for session_id, session in sessions:
+            with session.lock:
+                in_memory = sum(size for _, size, _ in session_memory_report(self._as_dict(session.state)))
+                rows.append({
+                    "session": session_id[:8],
+                    "running": session.running,
+                    "idle_seconds": int(now - session.last_active),
+                    "bytes": in_memory,
+                    "spilled_bytes": session.spilled_bytes,
+                })
+        return rows
+
+    def _session_dir(self, session_id):
+        return os.path.join(self.spill_dir, session_id)
+
+    @staticmethod
+    def _has_spilled(state):
+        if SPILLED_KNOWLEDGE_BASE_KEY in state:
+            return True
+        return any(key in state and isinstance(state[key], SpilledValue) for key in SPILLABLE_KEYS)
+
+    @staticmethod
+    def _as_dict(state):
+        return state.filtered_state if hasattr(state, "filtered_state") else dict(state)
+
+    def _spill(self, session_id, session):
+        state = session.state
+        cached = state["_knowledge_base"] if "_knowledge_base" in state else None
+        if cached is not None and self.knowledge_bases is not None:
+            data, handle = cached
+            if "processed_data" in state and state["processed_data"] is data and data is handle.knowledge_base.data:
+                # Shared views: remember the version and let the store reload it.
+                state[SPILLED_KNOWLEDGE_BASE_KEY] = handle.version
+                session.spilled = True
+                state["processed_data"] = None
+                if "document_layouts" in state:
+                    del state["document_layouts"]
+            del state["_knowledge_base"]
+            del cached, data, handle  # drop the handle so the reference is released
+
+        os.makedirs(self._session_dir(session_id), exist_ok=True)
+        for key in SPILLABLE_KEYS:
+            if key not in state:
+                continue
+            value = state[key]
+            if value is None or isinstance(value, SpilledValue) or is_shared(value):
+                continue
+            size = approximate_size(value)
+            if size < self.min_bytes:
+                continue
+            path = os.path.join(self._session_dir(session_id), f"{key}.pkl")
+            try:
+                with open(path, "wb") as f:
+                    pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+            except Exception as e:
+                print(f"Could not spill '{key}' of session {session_id[:8]}: {e}")
+                continue
+            state[key] = SpilledValue(path, size)
+            session.spilled = True
+            session.spilled_bytes += size
+        if session.spilled:
+            print(f"Session {session_id[:8]} idle: spilled {session.spilled_bytes} bytes to disk.")
+
+    def _rehydrate(self, session_id, session):
+        state = session.state
+        for key in SPILLABLE_KEYS:
+            if key not in state or not isinstance(state[key], SpilledValue):
+                continue
+            spilled = state[key]
+            try:
+                with open(spilled.path, "rb") as f:
+                    state[key] = pickle.load(f)
+            except Exception as e:
+                print(f"Could not restore '{key}' of session {session_id[:8]}: {e}")
+                del state[key]
+        if SPILLED_KNOWLEDGE_BASE_KEY in state:
+            version = state[SPILLED_KNOWLEDGE_BASE_KEY]
+            del state[SPILLED_KNOWLEDGE_BASE_KEY]
+            handle = self.knowledge_bases.acquire_version(version) if self.knowledge_bases is not None else None
+            if handle is None:
+                print(f"Knowledge base {version} of session {session_id[:8]} is gone; it must be uploaded again.")
+            else:
+                knowledge_base = handle.knowledge_base
+                state["processed_data"] = knowledge_base.data
+                state["document_layouts"] = knowledge_base.layouts
+                state["_knowledge_base"] = (knowledge_base.data, handle)
+        shutil.rmtree(self._session_dir(session_id), ignore_errors=True)
+        session.spilled = False
+        session.spilled_bytes = 0
@@ -0,0 +1,135 @@
+# praga/shared_store.py
+
+import json
+import threading
+import weakref
+from collections import OrderedDict
+
+from knowledge_base import KnowledgeBase, document_digest, knowledge_base_version
+
+# Text kept in memory for snapshots no session holds any more, so materials
+# that come back (a re-upload, the next teacher) are served without rebuilding.
+IDLE_MEMORY_CHARS = 256 * 1024 * 1024
+
+
+class KnowledgeBaseHandle:
+    """
+    A session's reference to a shared snapshot. While the handle exists the
+    snapshot stays in memory; once it is dropped (new materials loaded, the
+    session closed) the reference is released.
+    """
+
+    __slots__ = ("version", "knowledge_base", "__weakref__")
+
+    def __init__(self, store, knowledge_base):
+        self.version = knowledge_base.version
+        self.knowledge_base = knowledge_base
+        weakref.finalize(self, store.release, self.version)
+
+    def __repr__(self):
+        return f"KnowledgeBaseHandle(version={self.version!r})"
+
+
+class SharedKnowledgeBaseStore:
+    """
+    Process-wide, content-addressed home of knowledge-base snapshots.
+
+    Snapshots are keyed by their version (see
+    knowledge_base.knowledge_base_version) and file texts by their digest,
+    so sessions that load the same materials share one snapshot, with its
+    indexes, and overlapping sets of materials share the texts they have in
+    common. Sessions hold KnowledgeBaseHandle objects, which count as
+    references. Snapshots without references stay in memory up to
+    `idle_memory_chars`; beyond that the least recently released are written
+    to `spill` (a string key/value store such as ExtractionCache, or None)
+    and dropped, and acquire_version() can bring them back.
+    """
+
+    def __init__(self, spill=None, idle_memory_chars=IDLE_MEMORY_CHARS):
+        self.spill = spill
+        self.idle_memory_chars = idle_memory_chars
+        # RLock: a handle finalizer (release) can run during a collection
+        # triggered while this thread already holds the lock.
+        self._lock = threading.RLock()
+        self._texts = {}            # digest -> [text, snapshots using it]
+        self._snapshots = {}        # version -> [knowledge_base, handles]
+        self._idle = OrderedDict()  # version -> text size, least recently released first
+
+    def acquire(self, data, layouts=None):
+        """Returns a handle to the shared snapshot of {file: text} (and layouts), creating it if needed."""
+        digests = {name: document_digest(text) for name, text in data.items()}
+        layouts = {name: layouts[name] for name in data if name in layouts} if layouts else {}
+        version = knowledge_base_version(digests, layouts)
+        with self._lock:
+            entry = self._snapshots.get(version)
+            if entry is None:
+                texts = {name: self._intern(digests[name], text) for name, text in data.items()}
+                entry = self._snapshots[version] = [KnowledgeBase(texts, layouts, digests), 0]
+            entry[1] += 1
+            self._idle.pop(version, None)
+            return KnowledgeBaseHandle(self, entry[0])
+
+    def acquire_version(self, version):
+        """Returns a handle to the snapshot with `version`, reloading it from disk if it was spilled, or None."""
+        with self._lock:
+            entry = self._snapshots.get(version)
+            if entry is not None:
+                entry[1] += 1
+                self._idle.pop(version, None)
+                return KnowledgeBaseHandle(self, entry[0])
+        stored = self.spill.get(self._spill_key(version)) if self.spill is not None else None
+        if stored is None:
+            return None
+        record = json.loads(stored)
+        handle = self.acquire(record["data"], record["layouts"])
+        if handle.version != version:
+            print(f"Spilled knowledge base {version} came back as {handle.version}")
+        return handle
+
+    def release(self, version):
+        """Drops one reference to a snapshot; unreferenced snapshots become idle."""
+        with self._lock:
+            entry = self._snapshots.get(version)
+            if entry is None:
+                return
+            entry[1] -= 1
+            if entry[1] > 0:
+                return
+            self._idle[version] = entry[0].text_size
+            self._evict_idle()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "snapshots": len(self._snapshots),
+                "handles": sum(refs for _, refs in self._snapshots.values()),
+                "idle_snapshots": len(self._idle),
+                "unique_texts": len(self._texts),
+                "text_chars": sum(len(text) for text, _ in self._texts.values()),
+            }
+
+    def _intern(self, digest, text):
+        entry = self._texts.get(digest)
+        if entry is None:
+            entry = self._texts[digest] = [text, 0]
+        entry[1] += 1
+        return entry[0]
+
+    def _spill_key(self, version):
+        return f"knowledge-base:{version}"
+
+    def _evict_idle(self):
+        idle_chars = sum(self._idle.values())
+        while self._idle and idle_chars > self.idle_memory_chars:
+            version, size = self._idle.popitem(last=False)
+            knowledge_base, _ = self._snapshots.pop(version)
+            idle_chars -= size
+            if self.spill is not None:
+                record = {"data": dict(knowledge_base.data), "layouts": dict(knowledge_base.layouts)}
+                self.spill.set(self._spill_key(version), json.dumps(record, ensure_ascii=False))
+            for digest in knowledge_base.digests.values():
+                entry = self._texts[digest]
+                entry[1] -= 1
+                if entry[1] == 0:
+                    del self._texts[digest]
+            print(f"Knowledge base {version} evicted from memory ({size} characters).")
@@ -0,0 +1,165 @@
+# praga/telemetry.py
+
+import contextvars
+import json
+import threading
+import time
+from collections import defaultdict, deque
+
+from atomic_io import write_atomic
+
+# Set by main.py for every rerun; copied into worker threads together with the
+# submission time so calls made off the script thread are still attributed.
+current_page = contextvars.ContextVar("ai_current_page", default="unknown")
+queued_at = contextvars.ContextVar("ai_queued_at", default=None)
+
+LATENCY_BUCKETS = (0.5, 1, 2, 5, 10, 20, 30, 60, 120, 300)
+
+
+def submit_with_context(executor, fn, *args, **kwargs):
+    """
+    Submits `fn` to `executor` so that it runs with the caller's context
+    variables (the originating page) and with `queued_at` set to now.
+    """
+    ctx = contextvars.copy_context()
+    submitted = time.monotonic()
+
+    def run():
+        queued_at.set(submitted)
+        return fn(*args, **kwargs)
+
+    return executor.submit(ctx.run, run)
+
+
+class AITelemetry:
+    """
+    Collects one record per AI call and keeps aggregate counters per page and
+    model. Aggregates are flushed, at most every `flush_interval` seconds, to a
+    JSON file and to a Prometheus text-format file (suitable for the
+    node_exporter textfile collector).
+    """
+
+    def __init__(self, json_path=None, prometheus_path=None, history=200, flush_interval=5.0):
+        self.json_path = json_path
+        self.prometheus_path = prometheus_path
+        self.flush_interval = flush_interval
+        self._recent = deque(maxlen=history)
+        self._calls = defaultdict(int)            # (page, model, outcome, cache_hit) -> count
+        self._sums = defaultdict(float)           # (metric, page) -> sum
+        self._latency_buckets = defaultdict(int)  # (page, bucket) -> count
+        self._latency_count = defaultdict(int)    # page -> count
+        self._lock = threading.Lock()
+        self._last_flush = 0.0
+
+    def record(self, page, model, outcome, wall_time, queue_time=0.0, attempts=0, prompt_tokens=0,
+               completion_tokens=0, cache_hit=False, streamed=False):
+        """Records one AI call; `outcome` is 'ok', 'error', 'cancelled' or 'deadline'."""
+        entry = {
+            "timestamp": time.time(),
+            "page": page,
+            "model": model or "none",
+            "outcome": outcome,
+            "wall_time": round(wall_time, 4),
+            "queue_time": round(queue_time, 4),
+            "attempts": attempts,
+            "fallbacks": max(attempts - 1, 0),
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "cache_hit": cache_hit,
+            "streamed": streamed,
+        }
+        with self._lock:
+            self._recent.append(entry)
+            self._calls[(page, entry["model"], outcome, cache_hit)] += 1
+            self._sums[("wall_seconds", page)] += wall_time
+            self._sums[("queue_seconds", page)] += queue_time
+            self._sums[("fallbacks", page)] += entry["fallbacks"]
+            self._sums[("prompt_tokens", page)] += prompt_tokens
+            self._sums[("completion_tokens", page)] += completion_tokens
+            self._latency_count[page] += 1
+            for bucket in LATENCY_BUCKETS:
+                if wall_time <= bucket:
+                    self._latency_buckets[(page, bucket)] += 1
+            # Claimed under the lock, so only one of several concurrent callers flushes.
+            due = time.monotonic() - self._last_flush >= self.flush_interval
+            if due:
+                self._last_flush = time.monotonic()
+        if due:
+            self._write()
+
+    def recent(self, limit=50):
+        with self._lock:
+            return list(self._recent)[-limit:]
+
+    def summary(self):
+        """Returns per-page aggregates as a list of dicts."""
+        with self._lock:
+            pages = sorted(self._latency_count)
+            rows = []
+            for page in pages:
+                calls = self._latency_count[page]
+                cache_hits = sum(n for (p, _, _, hit), n in self._calls.items() if p == page and hit)
+                errors = sum(n for (p, _, outcome, _), n in self._calls.items() if p == page and outcome != "ok")
+                rows.append({
+                    "page": page,
+                    "calls": calls,
+                    "errors": errors,
+                    "cache_hits": cache_hits,
+                    "avg_wall_time": self._sums[("wall_seconds", page)] / calls,
+                    "avg_queue_time": self._sums[("queue_seconds", page)] / calls,
+                    "fallbacks": int(self._sums[("fallbacks", page)]),
+                    "prompt_tokens": int(self._sums[("prompt_tokens", page)]),
+                    "completion_tokens": int(self._sums[("completion_tokens", page)]),
+                })
+            return rows
+
+    def to_prometheus(self):
+        """Renders the aggregates in the Prometheus text exposition format."""
+        lines = [
+            "# HELP ai_calls_total AI calls by page, final model, outcome and cache hit.",
+            "# TYPE ai_calls_total counter",
+        ]
+        with self._lock:
+            for (page, model, outcome, cache_hit), count in sorted(self._calls.items()):
+                lines.append(
+                    f'ai_calls_total{{page="{page}",model="{model}",outcome="{outcome}",cache_hit="{str(cache_hit).lower()}"}} {count}'
+                )
+            lines += [
+                "# HELP ai_call_duration_seconds Wall time of AI calls, including queueing.",
+                "# TYPE ai_call_duration_seconds histogram",
+            ]
+            for page in sorted(self._latency_count):
+                for bucket in LATENCY_BUCKETS:
+                    lines.append(f'ai_call_duration_seconds_bucket{{page="{page}",le="{bucket}"}} {self._latency_buckets[(page, bucket)]}')
+                lines.append(f'ai_call_duration_seconds_bucket{{page="{page}",le="+Inf"}} {self._latency_count[page]}')
+                lines.append(f'ai_call_duration_seconds_sum{{page="{page}"}} {self._sums[("wall_seconds", page)]:.4f}')
+                lines.append(f'ai_call_duration_seconds_count{{page="{page}"}} {self._latency_count[page]}')
+            for metric, help_text in (
+                ("queue_seconds", "Time AI calls spent queued before starting."),
+                ("fallbacks", "Fallback attempts beyond the first model."),
+                ("prompt_tokens", "Estimated prompt tokens sent."),
+                ("completion_tokens", "Estimated completion tokens received."),
+            ):
+                lines += [f"# HELP ai_{metric}_total {help_text}", f"# TYPE ai_{metric}_total counter"]
+                for page in sorted(self._latency_count):
+                    lines.append(f'ai_{metric}_total{{page="{page}"}} {self._sums[(metric, page)]:.4f}')
+        return "\n".join(lines) + "\n"
+
+    def flush(self):
+        """Writes the JSON and Prometheus files; failures are logged and ignored."""
+        with self._lock:
+            self._last_flush = time.monotonic()
+        self._write()
+
+    def _write(self):
+        payload = {"updated_at": time.time(), "summary": self.summary(), "recent": self.recent()}
+        for path, content in (
+            (self.json_path, lambda: json.dumps(payload, ensure_ascii=False, indent=2)),
+            (self.prometheus_path, self.to_prometheus),
+        ):
+            if not path:
+                continue
+            try:
+                write_atomic(path, content())
+            except OSError as e:
+                print(f"Could not write AI metrics to {path}: {e}")
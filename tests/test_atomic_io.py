@@ -0,0 +1,25 @@
+# praga/tests/test_atomic_io.py
+
+import pytest
+
+from atomic_io import write_atomic
+
+
+def test_write_replaces_the_file(tmp_path):
+    path = tmp_path / "out" / "data.json"
+    write_atomic(str(path), "first")
+    write_atomic(str(path), "second")
+
+    assert path.read_text(encoding="utf-8") == "second"
+    assert [p.name for p in path.parent.iterdir()] == ["data.json"]
+
+
+def test_failed_write_leaves_the_old_file_and_no_temporary(tmp_path, monkeypatch):
+    path = tmp_path / "data.json"
+    write_atomic(str(path), "kept")
+    monkeypatch.setattr("atomic_io.os.replace", lambda src, dst: (_ for _ in ()).throw(OSError("no space")))
+
+    with pytest.raises(OSError):
+        write_atomic(str(path), "lost")
+    assert path.read_text(encoding="utf-8") == "kept"
+    assert [p.name for p in tmp_path.iterdir()] == ["data.json"]
@@ -0,0 +1,23 @@
+# praga/tests/test_context_budget.py
+
+import g4f
+
+import utils
+from context_packer import DEFAULT_CONTEXT_TOKENS, MODEL_CONTEXT_TOKENS, context_limit
+
+
+class _Provider:
+    default_model = "gpt-4"
+
+
+def test_provider_names_resolve_to_their_default_model(monkeypatch):
+    monkeypatch.setattr(g4f.Provider, "TestProvider", _Provider, raising=False)
+
+    assert utils.context_model_name("TestProvider") == "gpt-4"
+    assert context_limit([utils.context_model_name("TestProvider")]) == MODEL_CONTEXT_TOKENS["gpt-4"]
+
+
+def test_unknown_names_use_the_default_window():
+    names = [utils.context_model_name(name) for name in ("Model", "mock-fast")]
+
+    assert context_limit(names) == DEFAULT_CONTEXT_TOKENS
@@ -0,0 +1,58 @@
+# praga/tests/test_context_packer.py
+
+from context_packer import TRUNCATION_NOTE, estimate_tokens, pack_sections, pack_text
+
+PARAGRAPHS = "\n\n".join(f"Paragraph {i}: " + "word " * 20 for i in range(6))
+
+
+def _cost(header, text, separator="\n\n"):
+    return estimate_tokens(f"{header}\n{text}") + estimate_tokens(separator)
+
+
+def test_sections_that_fit_exactly_are_kept_whole():
+    sections = [("A:", "alpha " * 10), ("B:", "beta " * 10)]
+    budget = sum(_cost(header, text) for header, text in sections)
+
+    packed, truncated = pack_sections(sections, budget)
+    assert packed == "A:\n" + "alpha " * 10 + "\n\nB:\n" + "beta " * 10
+    assert not truncated
+
+
+def test_one_token_short_truncates_the_last_section():
+    sections = [("A:", "alpha " * 10), ("B:", PARAGRAPHS)]
+    budget = sum(_cost(header, text) for header, text in sections) - 1
+
+    packed, truncated = pack_sections(sections, budget)
+    assert truncated
+    assert packed.startswith("A:\n")
+    assert packed.endswith(TRUNCATION_NOTE)
+    assert "Paragraph 0" in packed and "Paragraph 5" not in packed
+
+
+def test_zero_budget_packs_nothing():
+    assert pack_sections([("A:", "alpha")], 0) == ("", True)
+
+
+def test_smaller_sections_after_one_that_does_not_fit_are_still_packed():
+    sections = [("Big:", "x" * 4000), ("Small:", "tiny")]
+
+    packed, truncated = pack_sections(sections, 40)
+    assert truncated
+    assert packed == "Small:\ntiny"
+
+
+def test_packed_text_stays_within_the_budget():
+    sections = [(f"File {i}:", PARAGRAPHS) for i in range(4)]
+    for budget in range(0, 400, 7):
+        packed, _ = pack_sections(sections, budget)
+        assert estimate_tokens(packed) <= budget
+
+
+def test_pack_text_cuts_at_paragraph_boundaries():
+    assert pack_text(PARAGRAPHS, estimate_tokens(PARAGRAPHS)) == PARAGRAPHS
+
+    packed = pack_text(PARAGRAPHS, 40)
+    kept = packed[:-len(TRUNCATION_NOTE)].strip()
+    assert packed.endswith(TRUNCATION_NOTE)
+    assert PARAGRAPHS.startswith(kept)
+    assert estimate_tokens(packed) <= 40
@@ -0,0 +1,70 @@
+# praga/tests/test_data_extractor.py
+
+import json
+import os
+
+import pytest
+
+from data_extractor import index_folder, process_folder_and_save_json
+from kb_store import KnowledgeBaseStore
+
+
+@pytest.fixture
+def workdir(tmp_path, monkeypatch):
+    # The extraction cache lives under ./output; keep it inside the test's directory.
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setenv("EDU_EXTRACTION_CACHE", "off")
+    folder = tmp_path / "materials"
+    folder.mkdir()
+    for i in range(1, 4):
+        (folder / f"f{i}.txt").write_text(f"Lecture {i} on raster graphics.", encoding="utf-8")
+    return folder, tmp_path / "out"
+
+
+def _saved_paths(output_dir, storage):
+    if storage == "sqlite":
+        return sorted(KnowledgeBaseStore(os.path.join(output_dir, "data_content.sqlite3")).paths())
+    with open(os.path.join(output_dir, "data_content.json"), encoding="utf-8") as f:
+        return sorted(json.load(f))
+
+
+@pytest.mark.parametrize("storage", ["sqlite", "json"])
+def test_unchanged_files_are_reextracted_when_the_store_is_lost(workdir, storage):
+    folder, output_dir = workdir
+    data_file = "data_content.sqlite3" if storage == "sqlite" else "data_content.json"
+
+    assert process_folder_and_save_json(str(folder), str(output_dir), parallel=False, storage=storage)
+    os.remove(os.path.join(output_dir, data_file))
+    (folder / "f4.txt").write_text("Lecture 4 on clipping.", encoding="utf-8")
+
+    expected = ["f1.txt", "f2.txt", "f3.txt", "f4.txt"]
+    assert process_folder_and_save_json(str(folder), str(output_dir), parallel=False, storage=storage)
+    assert _saved_paths(output_dir, storage) == expected
+    assert process_folder_and_save_json(str(folder), str(output_dir), parallel=False, storage=storage)
+    assert _saved_paths(output_dir, storage) == expected
+
+
+def test_files_without_text_are_not_reextracted(workdir):
+    folder, output_dir = workdir
+    (folder / "blank.txt").write_text("   \n", encoding="utf-8")
+
+    assert process_folder_and_save_json(str(folder), str(output_dir), parallel=False, storage="sqlite")
+    with open(os.path.join(output_dir, "data_content.manifest.json"), encoding="utf-8") as f:
+        previous_files = json.load(f)["files"]
+    assert previous_files["blank.txt"]["empty"] is True
+
+    order, updates, files, stats = index_folder(
+        str(folder), previous_files, set(_saved_paths(output_dir, "sqlite")), parallel=False
+    )
+    assert order == ["f1.txt", "f2.txt", "f3.txt"]
+    assert updates == {}
+    assert stats == {"added": 0, "changed": 0, "removed": 0, "unchanged": 4}
+    assert files["blank.txt"]["empty"] is True
+
+
+def test_json_is_the_default_store(workdir):
+    folder, output_dir = workdir
+
+    path = process_folder_and_save_json(str(folder), str(output_dir), parallel=False)
+    assert path == os.path.join(str(output_dir), "data_content.json")
+    assert _saved_paths(output_dir, "json") == ["f1.txt", "f2.txt", "f3.txt"]
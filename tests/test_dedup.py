@@ -0,0 +1,50 @@
+# praga/tests/test_dedup.py
+
+import random
+
+from dedup import find_near_duplicates, minhash_signature
+
+_rng = random.Random(7)
+VOCABULARY = [f"term{i}" for i in range(2000)]
+
+
+def _text(words=400):
+    return " ".join(_rng.choice(VOCABULARY) for _ in range(words))
+
+
+def _edited(text, every=60):
+    words = text.split()
+    return " ".join("changed" if i % every == 0 else word for i, word in enumerate(words))
+
+
+def test_near_copies_are_grouped_and_the_longest_is_kept():
+    lecture = _text()
+    data = {
+        "lecture.pdf": lecture,
+        "lecture_copy.pdf": _edited(lecture),
+        "lecture_extended.pdf": lecture + " appendix with a few more words",
+        "worksheet.docx": _text(),
+    }
+
+    duplicates = find_near_duplicates(data)
+    assert set(duplicates) == {"lecture.pdf", "lecture_copy.pdf"}
+    assert all(kept == "lecture_extended.pdf" and similarity >= 0.8 for kept, similarity in duplicates.values())
+
+
+def test_identical_texts_keep_the_first():
+    text = _text()
+
+    assert find_near_duplicates({"a.txt": text, "b.txt": text}) == {"b.txt": ("a.txt", 1.0)}
+
+
+def test_unrelated_and_empty_texts_are_not_duplicates():
+    assert find_near_duplicates({"a.txt": _text(), "b.txt": _text(), "c.txt": "", "d.txt": "  "}) == {}
+    assert minhash_signature("...") is None
+
+
+def test_threshold_decides_borderline_pairs():
+    text = _text()
+    data = {"a.txt": text, "b.txt": _edited(text, every=20)}
+
+    assert find_near_duplicates(data, threshold=0.99) == {}
+    assert set(find_near_duplicates(data, threshold=0.5)) == {"b.txt"}
@@ -0,0 +1,63 @@
+# praga/tests/test_documents.py
+
+from documents import DocumentIndex, build_chunks, citation
+
+TEXT = (
+    "Intro text.\n"
+    "# Transformations\n"
+    "About transformations.\n"
+    "## Rotation\n"
+    "Rotate around the origin.\n"
+    "## Scaling\n"
+    "Scale by a factor.\n"
+    "# Projections\n"
+    "Parallel and perspective.\n"
+)
+
+
+def test_chunks_start_at_headings_and_carry_their_path():
+    chunks = build_chunks("notes.md", TEXT)
+
+    assert [chunk["heading_path"] for chunk in chunks] == [
+        [],
+        ["Transformations"],
+        ["Transformations", "Rotation"],
+        ["Transformations", "Scaling"],
+        ["Projections"],
+    ]
+    assert [chunk["id"] for chunk in chunks] == [f"notes.md#{n}" for n in range(1, 6)]
+    assert TEXT[chunks[2]["start"]:chunks[2]["end"]] == "## Rotation\nRotate around the origin.\n"
+
+
+def test_chunks_cover_the_text_without_gaps():
+    text = "\n\n".join("Sentence number %d is here." % i for i in range(200))
+    chunks = build_chunks("long.txt", text, target=300)
+
+    assert len(chunks) > 1
+    assert chunks[0]["start"] == 0 and chunks[-1]["end"] == len(text)
+    for previous, chunk in zip(chunks, chunks[1:]):
+        assert previous["end"] == chunk["start"]
+    assert all(chunk["end"] - chunk["start"] <= 300 for chunk in chunks)
+    # Cuts fall on paragraph breaks.
+    assert all(text[chunk["end"] - 2:chunk["end"]] == "\n\n" for chunk in chunks[:-1])
+
+
+def test_chunks_never_cross_page_boundaries():
+    text = "Page one text. " * 10 + "Page two text. " * 10
+    middle = len(text) // 2
+    layout = {
+        "units": [["page", 1, 0, middle], ["page", 2, middle, len(text)]],
+        "headings": [[middle, 1, "Second page"]],
+    }
+    chunks = build_chunks("lecture.pdf", text, layout)
+
+    assert [(chunk["number"], chunk["start"], chunk["end"]) for chunk in chunks] == [(1, 0, middle), (2, middle, len(text))]
+    assert citation(chunks[1]) == "lecture.pdf, page 2 › Second page"
+
+
+def test_index_slices_chunk_text_by_id():
+    index = DocumentIndex({"notes.md": TEXT})
+
+    assert "notes.md#3" in index
+    assert index.text("notes.md#3") == "## Rotation\nRotate around the origin."
+    assert index.get("missing#1") is None
@@ -0,0 +1,43 @@
+# praga/tests/test_hedging.py
+
+import threading
+import time
+
+import utils
+
+
+def test_losing_attempts_are_stopped_and_discarded(monkeypatch):
+    monkeypatch.setattr(utils, "HEDGE_DELAY_SECONDS", 0.01)
+    release = threading.Event()
+    stopped = []
+    discarded = []
+
+    def attempt(model_name, stop_event):
+        if model_name == "fast":
+            release.wait(1)
+            return "answer"
+        release.set()
+        stop_event.wait(1)
+        stopped.append(model_name)
+        return f"late {model_name}"
+
+    model_name, result, attempts = utils._run_hedged(
+        ["slow", "fast"], attempt, time.monotonic() + 30, discard=discarded.append
+    )
+
+    assert (model_name, result) == ("fast", "answer")
+    deadline = time.monotonic() + 1
+    while len(discarded) < 1 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert stopped == ["slow"]
+    assert discarded == ["late slow"]
+    assert attempts <= utils.HEDGE_FANOUT
+
+
+def test_attempts_do_not_queue_behind_abandoned_ones():
+    blocked = threading.Event()
+    futures = [utils._start_attempt(blocked.wait, 5) for _ in range(32)]
+
+    assert utils._start_attempt(lambda: "free").result(timeout=1) == "free"
+    blocked.set()
+    assert all(future.result(timeout=1) for future in futures)
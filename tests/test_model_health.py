@@ -0,0 +1,50 @@
+# praga/tests/test_model_health.py
+
+import threading
+import time
+
+import utils
+
+
+def test_concurrent_cold_starts_probe_once(monkeypatch, tmp_path):
+    monkeypatch.setattr(utils, "MODEL_HEALTH_FILE", str(tmp_path / "model_health.json"))
+    monkeypatch.setattr(utils, "_model_health", {})
+    monkeypatch.setattr(utils, "_candidate_model_names", lambda: ["a", "b"])
+    probed = []
+
+    def probe(model_name):
+        probed.append(model_name)
+        time.sleep(0.1)
+        return {"ok": True, "latency": 0.1, "checked_at": time.time()}
+
+    monkeypatch.setattr(utils, "_probe_model", probe)
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(utils.get_functional_models())) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert sorted(probed) == ["a", "b"]
+    assert results == [["a", "b"]] * 4
+
+
+def test_failed_probes_do_not_block_a_later_start(monkeypatch, tmp_path):
+    monkeypatch.setattr(utils, "MODEL_HEALTH_FILE", str(tmp_path / "model_health.json"))
+    monkeypatch.setattr(utils, "_model_health", {})
+    monkeypatch.setattr(utils, "_candidate_model_names", lambda: ["a"])
+    monkeypatch.setattr(utils.st, "error", lambda message: None)
+    outage = [True]
+    monkeypatch.setattr(
+        utils, "_probe_model",
+        lambda model_name: {"ok": not outage[0], "latency": 0.1, "checked_at": time.time()}
+    )
+
+    assert utils.get_functional_models() == []
+
+    # The providers recover and the server restarts after the failure TTL has passed.
+    outage[0] = False
+    monkeypatch.setattr(utils, "_model_health", None)
+    monkeypatch.setattr(utils, "MODEL_HEALTH_FAILED_TTL_SECONDS", 0)
+    time.sleep(0.01)
+    assert utils.get_functional_models() == ["a"]
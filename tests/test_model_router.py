@@ -0,0 +1,94 @@
+# praga/tests/test_model_router.py
+
+from types import SimpleNamespace
+
+import pytest
+
+import model_router
+from model_router import CLOSED, HALF_OPEN, OPEN, ModelRouter
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(model_router, "time", SimpleNamespace(monotonic=lambda: now[0]))
+    return now
+
+
+def _router():
+    return ModelRouter(failure_threshold=2, base_cooldown=30.0, max_cooldown=100.0)
+
+
+def _fail(router, name, times):
+    for _ in range(times):
+        router.record_failure(name, 1.0)
+
+
+def test_models_are_ordered_by_expected_latency(clock):
+    router = _router()
+    router.record_success("slow", 10.0)
+    router.record_success("fast", 1.0)
+
+    assert router.order(["slow", "fast", "new"]) == ["fast", "slow", "new"]
+
+
+def test_breaker_opens_after_consecutive_failures(clock):
+    router = _router()
+    _fail(router, "a", 1)
+    assert router.order(["a", "b"]) == ["b", "a"]
+
+    _fail(router, "a", 1)
+    assert router.snapshot()["a"]["state"] == OPEN
+    assert router.order(["a", "b"]) == ["b"]
+
+
+def test_half_open_trial_is_granted_once_after_the_cooldown(clock):
+    router = _router()
+    _fail(router, "a", 2)
+
+    clock[0] += 30.0
+    assert router.order(["a", "b"]) == ["b", "a"]
+    assert router.snapshot()["a"]["state"] == HALF_OPEN
+    # The trial is out; other callers do not get it too.
+    assert router.order(["a", "b"]) == ["b"]
+
+
+def test_unused_trial_is_granted_again_after_another_cooldown(clock):
+    router = _router()
+    _fail(router, "a", 2)
+    clock[0] += 30.0
+    router.order(["a"])
+
+    clock[0] += 29.0
+    assert router.order(["a"]) == []
+    clock[0] += 1.0
+    assert router.order(["a"]) == ["a"]
+
+
+def test_trial_success_closes_and_failure_doubles_the_cooldown(clock):
+    router = _router()
+    _fail(router, "a", 2)
+    clock[0] += 30.0
+    router.order(["a"])
+    _fail(router, "a", 1)
+    assert router.snapshot()["a"]["state"] == OPEN
+
+    clock[0] += 59.0
+    assert router.order(["a"]) == []
+    clock[0] += 1.0
+    assert router.order(["a"]) == ["a"]
+    router.record_success("a", 2.0)
+    assert router.snapshot()["a"]["state"] == CLOSED
+    assert router.order(["a"]) == ["a"]
+
+
+def test_cooldown_is_capped(clock):
+    router = _router()
+    _fail(router, "a", 2)
+    for _ in range(4):
+        clock[0] += 1000.0
+        router.order(["a"])
+        _fail(router, "a", 1)
+
+    clock[0] += 100.0
+    assert router.order(["a"]) == ["a"]
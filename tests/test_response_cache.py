@@ -0,0 +1,68 @@
+# praga/tests/test_response_cache.py
+
+from types import SimpleNamespace
+
+import pytest
+
+import response_cache
+from response_cache import ResponseCache, make_cache_key
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(response_cache, "time", SimpleNamespace(time=lambda: now[0]))
+    return now
+
+
+def _disk_only(tmp_path, **kwargs):
+    # With no memory entries every lookup goes to SQLite.
+    return ResponseCache(str(tmp_path / "cache.sqlite3"), memory_entries=0, **kwargs)
+
+
+def test_key_ignores_the_model_but_not_the_request():
+    messages = [{"role": "user", "content": "question"}]
+
+    assert make_cache_key(messages, {"model": "a", "temp": 0.3}) == make_cache_key(messages, {"model": "b", "temp": 0.3})
+    assert make_cache_key(messages, {"temp": 0.3}) != make_cache_key(messages, {"temp": 0.7})
+
+
+@pytest.mark.parametrize("memory_entries", [0, 8])
+def test_entries_expire_after_the_ttl(tmp_path, clock, memory_entries):
+    cache = ResponseCache(str(tmp_path / "cache.sqlite3"), ttl_seconds=60, memory_entries=memory_entries)
+    cache.set("k", "answer")
+
+    clock[0] += 60
+    assert cache.get("k") == "answer"
+    clock[0] += 1
+    assert cache.get("k") is None
+
+
+def test_disk_tier_survives_a_new_instance(tmp_path, clock):
+    ResponseCache(str(tmp_path / "cache.sqlite3")).set("k", "answer")
+
+    assert ResponseCache(str(tmp_path / "cache.sqlite3")).get("k") == "answer"
+
+
+def test_disk_tier_evicts_least_recently_used_first(tmp_path, clock):
+    cache = _disk_only(tmp_path, max_disk_bytes=25)
+    for key in ("a", "b"):
+        cache.set(key, "x" * 10)
+        clock[0] += 1
+    assert cache.get("a") == "x" * 10
+    clock[0] += 1
+
+    cache.set("c", "x" * 10)
+    assert cache.get("a") == "x" * 10
+    assert cache.get("b") is None
+    assert cache.get("c") == "x" * 10
+
+
+def test_memory_tier_keeps_the_most_recent_entries(tmp_path, clock):
+    cache = ResponseCache(str(tmp_path / "cache.sqlite3"), memory_entries=2)
+    for key in ("a", "b", "c"):
+        cache.set(key, key)
+
+    assert list(cache._memory) == ["b", "c"]
+    assert cache.get("a") == "a"
+    assert list(cache._memory) == ["c", "a"]
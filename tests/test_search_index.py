@@ -0,0 +1,49 @@
+# praga/tests/test_search_index.py
+
+import numpy as np
+
+from search_index import BM25Index, tokenize
+
+TEXTS = [
+    "Bresenham's line algorithm uses integer arithmetic to rasterise a line.",
+    "Transformări geometrice: translație, rotație și scalare.",
+    "Parallel projections keep lines parallel; perspective projections do not.",
+    "Line clipping with Cohen-Sutherland. Line line line.",
+]
+
+
+def test_tokens_are_folded_and_short_ones_dropped():
+    assert tokenize("Transformări 2D: a Rotație") == ["transformari", "2d", "rotatie"]
+
+
+def test_matches_only_documents_containing_the_terms():
+    index = BM25Index(TEXTS)
+
+    assert [doc_id for doc_id, _ in index.top("projections")] == [2]
+    assert index.top("unknownterm") == []
+    assert [doc_id for doc_id, _ in index.top("transformari rotatie")] == [1]
+
+
+def test_ranking_follows_term_frequency_and_rarity():
+    index = BM25Index(TEXTS)
+
+    ranked = [doc_id for doc_id, _ in index.top("line")]
+    assert ranked == [3, 0]
+    # A rare term outweighs a common one.
+    scores = index.scores("line bresenham")
+    assert scores[0] > scores[3]
+
+
+def test_limit_keeps_the_best_documents_in_order():
+    index = BM25Index(TEXTS)
+    full = index.top("line projections")
+
+    assert index.top("line projections", limit=2) == full[:2]
+    assert np.all(np.diff([score for _, score in full]) <= 0)
+
+
+def test_empty_index():
+    index = BM25Index([])
+
+    assert len(index) == 0
+    assert index.top("line") == []
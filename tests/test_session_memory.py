@@ -0,0 +1,60 @@
+# praga/tests/test_session_memory.py
+
+from session_memory import SPILLED_KNOWLEDGE_BASE_KEY, SessionMemoryManager, SpilledValue
+
+
+def _manager(tmp_path):
+    return SessionMemoryManager(str(tmp_path / "spill"), idle_seconds=0, min_bytes=1)
+
+
+def test_running_session_is_not_spilled(tmp_path):
+    manager = _manager(tmp_path)
+    state = {"chat_history": [{"role": "user", "content": "question " * 100}]}
+    manager.touch("s1", state)
+
+    manager.sweep()
+    assert isinstance(state["chat_history"], list)
+
+    manager.finish("s1")
+    manager.sweep()
+    assert isinstance(state["chat_history"], SpilledValue)
+
+
+def test_spilled_values_come_back_on_touch(tmp_path):
+    manager = _manager(tmp_path)
+    history = [{"role": "user", "content": "question " * 100}]
+    state = {"chat_history": list(history), "main_nav_radio": "chat"}
+    manager.touch("s1", state)
+    manager.finish("s1")
+    manager.sweep()
+
+    manager.touch("s1", state)
+    assert state["chat_history"] == history
+    assert state["main_nav_radio"] == "chat"
+
+
+def test_touch_restores_values_the_registry_no_longer_tracks(tmp_path):
+    manager = _manager(tmp_path)
+    history = [{"role": "user", "content": "question " * 100}]
+    state = {"chat_history": list(history), SPILLED_KNOWLEDGE_BASE_KEY: "missing"}
+    manager.touch("s1", state)
+    manager.finish("s1")
+    manager.sweep()
+    # A reconnecting browser brings back a state the registry has lost track of.
+    manager._sessions.clear()
+
+    manager.touch("s1", state)
+    assert state["chat_history"] == history
+    assert SPILLED_KNOWLEDGE_BASE_KEY not in state
+
+
+def test_forgotten_sessions_never_keep_spilled_placeholders(tmp_path):
+    manager = _manager(tmp_path)
+    state = {"chat_history": [{"role": "user", "content": "question " * 100}]}
+    manager.touch("s1", state)
+    manager.finish("s1")
+    manager.sweep()
+    manager.sweep(is_known=lambda session_id: False)
+
+    manager.touch("s1", state)
+    assert not isinstance(state.get("chat_history"), SpilledValue)
@@ -0,0 +1,71 @@
+# praga/tests/test_streaming.py
+
+import threading
+import time
+
+import utils
+from mock_ai_provider import MockAIClient
+from page_chat import _answered
+
+
+def _stream(monkeypatch, **client_settings):
+    monkeypatch.setattr(utils, "get_functional_models", lambda: ["mock-fast"])
+    client = MockAIClient(models=["mock-fast"], latency_median=0.01, latency_sigma=0.0,
+                          tokens_per_second=10000, seed=1, **client_settings)
+    return utils.StreamedReply(utils.stream_direct_with_ai_service("question", "system", client, use_cache=False))
+
+
+def test_failed_stream_is_reported(monkeypatch):
+    reply = _stream(monkeypatch, failure_rate=1.0)
+
+    text = "".join(reply)
+    assert reply.failed
+    assert text == utils.AI_NO_MODEL_MESSAGE
+
+
+def test_answered_stream_is_not_a_failure(monkeypatch):
+    reply = _stream(monkeypatch)
+
+    assert "".join(reply)
+    assert not reply.failed
+
+
+def test_failed_replies_and_their_questions_are_not_resent():
+    history = [
+        {"role": "user", "content": "first"},
+        {"role": "assistant", "content": "answer"},
+        {"role": "user", "content": "second"},
+        {"role": "assistant", "content": utils.AI_NO_MODEL_MESSAGE, "failed": True},
+        {"role": "user", "content": "third"},
+    ]
+
+    assert [msg["content"] for msg in _answered(history)] == ["first", "answer", "third"]
+
+
+def test_closing_a_cancellable_stream_cancels_the_call(monkeypatch):
+    monkeypatch.setattr(utils, "AI_UI_POLL_SECONDS", 0.01)
+    cancelled = threading.Event()
+
+    def deltas(cancel_event=None):
+        yield "first"
+        if cancel_event.wait(2):
+            cancelled.set()
+        yield "never read"
+
+    reply = iter(utils.stream_cancellable("Testing", deltas))
+    assert next(reply) == "first"
+    reply.close()
+
+    assert cancelled.wait(2)
+
+
+def test_cancellable_stream_reports_failures(monkeypatch):
+    monkeypatch.setattr(utils, "AI_UI_POLL_SECONDS", 0.01)
+
+    def deltas(cancel_event=None):
+        time.sleep(0.05)
+        yield utils.AIFailure(utils.AI_CANCELLED_MESSAGE)
+
+    reply = utils.stream_cancellable("Testing", deltas)
+    assert "".join(reply) == utils.AI_CANCELLED_MESSAGE
+    assert reply.failed
@@ -0,0 +1,39 @@
+# praga/tests/test_telemetry.py
+
+import json
+import threading
+
+from telemetry import AITelemetry
+
+
+def test_concurrent_flushes_leave_complete_files(tmp_path):
+    json_path = tmp_path / "metrics" / "ai_metrics.json"
+    collector = AITelemetry(str(json_path), str(tmp_path / "metrics" / "ai_metrics.prom"), flush_interval=0)
+
+    def record():
+        for _ in range(50):
+            collector.record("chat", "mock-fast", "ok", 0.1)
+
+    threads = [threading.Thread(target=record) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    collector.flush()
+
+    assert json.loads(json_path.read_text(encoding="utf-8"))["summary"][0]["calls"] == 400
+    assert sorted(p.name for p in json_path.parent.iterdir()) == ["ai_metrics.json", "ai_metrics.prom"]
+
+
+def test_only_one_caller_claims_a_due_flush(tmp_path, monkeypatch):
+    collector = AITelemetry(str(tmp_path / "ai_metrics.json"), flush_interval=60)
+    writes = []
+    monkeypatch.setattr(collector, "_write", lambda: writes.append(1))
+
+    threads = [threading.Thread(target=collector.record, args=("chat", None, "ok", 0.1)) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(writes) == 1
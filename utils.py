@@ -1,17 +1,35 @@
 import streamlit as st
+import g4f
 from g4f.client import Client
 from g4f.errors import RateLimitError, ProviderNotFoundError, ModelNotFoundError
 import pandas as pd
+import numpy as np
 import re
 import json
 import os
 from docx import Document as DocxDocument
 from io import BytesIO
-import pdfplumber
 from pptx import Presentation
 from pptx.util import Pt, Inches
 from pptx.dml.color import RGBColor
 import inspect
+import queue
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed, wait, FIRST_COMPLETED, TimeoutError as FuturesTimeoutError
+from model_router import ModelRouter
+from response_cache import ResponseCache, make_cache_key
+from context_packer import context_budget, estimate_tokens, pack_sections
+import telemetry
+from atomic_io import write_atomic
+from mock_ai_provider import MockAIClient
+from data_extractor import SUPPORTED_EXTENSIONS, cached_extract_text, document_layout, extract_many, get_extraction_cache
+from documents import citation
+from dedup import find_near_duplicates
+from knowledge_base import CURRICULUM_FILE_SEPARATOR
+from shared_store import SharedKnowledgeBaseStore
+from session_memory import IDLE_SESSION_SECONDS, SessionMemoryManager
+from extraction_cache import ExtractionCache
 
 # --- Initial Data (can be overwritten) ---
 DEFAULT_COMPETENCIES_SPECIFIC = {
@@ -41,18 +59,237 @@ COVERAGE_LEGEND_EN_KEYS_FOR_AI = {
 
 # --- Data Management Helper Functions ---
 
-def get_curriculum_context():
-    """Loads the aggregated text content from the user's session state."""
-    if 'processed_data' not in st.session_state or not st.session_state.processed_data:
+# Material budget for query-based context when the caller does not give one.
+DEFAULT_RETRIEVAL_TOKENS = 6000
+# Keyword (BM25) and semantic rankings are merged with reciprocal rank fusion;
+# the semantic side contributes its best DENSE_CANDIDATES chunks.
+RRF_K = 60
+DENSE_CANDIDATES = 50
+# A file's relevance is the sum of its best chunk scores, so a file focused on a
+# topic outranks a longer one that only mentions it in passing.
+FILE_RANK_CHUNKS = 3
+
+# Knowledge bases no session uses any more are written here once evicted from memory.
+SHARED_KB_SPILL_PATH = os.path.join("output", "knowledge_base_spill.sqlite3")
+SHARED_KB_SPILL_MAX_DISK_BYTES = 500 * 1024 * 1024
+
+@st.cache_resource(show_spinner=False)
+def get_shared_knowledge_bases():
+    """Returns the process-wide store of knowledge-base snapshots, shared by every session."""
+    try:
+        spill = ExtractionCache(SHARED_KB_SPILL_PATH, max_disk_bytes=SHARED_KB_SPILL_MAX_DISK_BYTES)
+    except Exception as e:
+        print(f"Knowledge base spill disabled: {e}")
+        spill = None
+    return SharedKnowledgeBaseStore(spill)
+
+# Large artifacts of sessions idle this long are written here until the session is used again.
+SESSION_SPILL_DIR = os.path.join("output", "session_spill")
+SESSION_IDLE_SECONDS = int(os.environ.get("EDU_SESSION_IDLE_SECONDS", IDLE_SESSION_SECONDS))
+
+def _session_is_known(session_id):
+    """
+    True while the runtime still holds the session, connected or not: a
+    disconnected session is kept so its browser can reconnect to it.
+    """
+    from streamlit import runtime
+    if not runtime.exists():
+        return True
+    session_manager = getattr(runtime.get_instance(), "_session_mgr", None)
+    if session_manager is None:
+        return runtime.get_instance().is_active_session(session_id)
+    return session_manager.get_session_info(session_id) is not None
+
+@st.cache_resource(show_spinner=False)
+def get_session_memory():
+    """Returns the process-wide session memory manager, with its idle-session sweeper running."""
+    manager = SessionMemoryManager(SESSION_SPILL_DIR, get_shared_knowledge_bases(), idle_seconds=SESSION_IDLE_SECONDS)
+    manager.start(is_known=_session_is_known)
+    return manager
+
+def track_session():
+    """
+    Marks the current session running, so it is not spilled underneath the
+    run, and restores whatever was spilled while it was idle. Pair every
+    script run with finish_session(); widget callbacks that read spillable
+    values call this first, since they run before the script.
+    """
+    from streamlit.runtime.scriptrunner import get_script_run_ctx
+    ctx = get_script_run_ctx(suppress_warning=True)
+    if ctx is not None:
+        get_session_memory().touch(ctx.session_id, ctx.session_state)
+
+def finish_session():
+    """Marks the current session's script run as finished."""
+    from streamlit.runtime.scriptrunner import get_script_run_ctx
+    ctx = get_script_run_ctx(suppress_warning=True)
+    if ctx is not None:
+        get_session_memory().finish(ctx.session_id)
+
+def get_knowledge_base():
+    """
+    Returns the snapshot of the session's materials (see
+    knowledge_base.KnowledgeBase). It is looked up once per processed_data
+    object, so reruns reuse the joined text, packed contexts and indexes;
+    loading new materials replaces processed_data and with it the snapshot.
+    Snapshots live in the process-wide shared store, so sessions with the
+    same materials share one; the session only keeps a handle to it. Page
+    and slide structure comes from document_layouts when the files were
+    uploaded with it.
+    """
+    data = st.session_state.get('processed_data')
+    if not data:
+        return None
+    cached = st.session_state.get('_knowledge_base')
+    if cached is None or cached[0] is not data:
+        handle = get_shared_knowledge_bases().acquire(data, st.session_state.get('document_layouts'))
+        cached = (data, handle)
+        st.session_state['_knowledge_base'] = cached
+    return cached[1].knowledge_base
+
+def get_document_index():
+    """Returns the chunk index over the session's materials."""
+    knowledge_base = get_knowledge_base()
+    return knowledge_base.document_index if knowledge_base else None
+
+def get_search_index():
+    """Returns the BM25 index over the session's chunks."""
+    knowledge_base = get_knowledge_base()
+    return knowledge_base.search_index if knowledge_base else None
+
+def start_dense_index():
+    """Starts building the semantic index over the session's chunks in the background."""
+    knowledge_base = get_knowledge_base()
+    if knowledge_base:
+        knowledge_base.start_dense_index()
+
+def get_dense_index():
+    """Returns the session's semantic index if it has finished building, otherwise None (without waiting)."""
+    knowledge_base = get_knowledge_base()
+    return knowledge_base.dense_index if knowledge_base else None
+
+def search_chunks(query, limit=None):
+    """
+    Returns the ids of the chunks matching `query`, most relevant first.
+    Keyword matches are fused with the semantic index's nearest chunks once
+    that index is ready, so paraphrases are found too.
+    """
+    search_index = get_search_index()
+    if search_index is None:
+        return []
+    chunks = get_document_index().chunks
+    keyword = [doc_id for doc_id, _ in search_index.top(query)]
+    dense_index = get_dense_index()
+    if dense_index is None:
+        ranked = keyword
+    else:
+        fused = {}
+        for ranking in (keyword, [doc_id for doc_id, _ in dense_index.top(query, DENSE_CANDIDATES)]):
+            for rank, doc_id in enumerate(ranking):
+                fused[doc_id] = fused.get(doc_id, 0.0) + 1.0 / (RRF_K + rank + 1)
+        ranked = sorted(fused, key=lambda doc_id: (-fused[doc_id], doc_id))
+    return [chunks[doc_id]["id"] for doc_id in ranked[:limit]]
+
+def rank_files(query, limit=None):
+    """
+    Returns [(file name, score)] for the files whose content matches `query`,
+    most relevant first (ties by name). Uses the keyword index only, so the
+    ranking is deterministic for a given set of materials.
+    """
+    search_index = get_search_index()
+    if search_index is None:
+        return []
+    chunks = get_document_index().chunks
+    scores = search_index.scores(query)
+    per_file = {}
+    for doc_id in np.flatnonzero(scores > 0):
+        per_file.setdefault(chunks[doc_id]["file"], []).append(float(scores[doc_id]))
+    ranked = [
+        (name, sum(sorted(file_scores, reverse=True)[:FILE_RANK_CHUNKS]))
+        for name, file_scores in per_file.items()
+    ]
+    ranked.sort(key=lambda item: (-item[1], item[0]))
+    return ranked[:limit]
+
+def _chunk_header(chunk):
+    return f"Excerpt [{chunk['id']}] from {citation(chunk)}:"
+
+def select_chunks(query, token_budget):
+    """Returns the ids of the best-matching chunks for `query` that together fit in `token_budget` tokens."""
+    index = get_document_index()
+    separator_cost = estimate_tokens(CURRICULUM_FILE_SEPARATOR)
+    chosen, used = [], 0
+    for chunk_id in search_chunks(query):
+        chunk = index.get(chunk_id)
+        cost = estimate_tokens(_chunk_header(chunk)) + estimate_tokens(index.text(chunk)) + separator_cost
+        if used + cost <= token_budget:
+            chosen.append(chunk_id)
+            used += cost
+    return chosen
+
+def _chunk_sections(chunk_ids):
+    """Returns ((header, text) sections, distinct file count) for the given chunk ids, skipping unknown ids."""
+    index = get_document_index()
+    if index is None:
+        return [], 0
+    chunks = [index.get(chunk_id) for chunk_id in chunk_ids if chunk_id in index]
+    sections = [(_chunk_header(chunk), index.text(chunk)) for chunk in chunks]
+    return sections, len({chunk["file"] for chunk in chunks})
+
+def get_curriculum_context(query=None, token_budget=None, chunk_ids=None):
+    """
+    Loads the aggregated text content from the session's knowledge base
+    snapshot; the joined text is built once per snapshot, not per rerun.
+
+    With a `query`, only the chunks that rank highest for it (BM25) are
+    returned, as many as fit in `token_budget` tokens (default
+    DEFAULT_RETRIEVAL_TOKENS); if nothing matches, the materials are packed
+    into the budget as a whole instead. With `chunk_ids`, exactly those
+    chunks are returned. Chunks are headed by their id and citation, and the
+    count is then the number of distinct files they come from.
+    """
+    knowledge_base = get_knowledge_base()
+    if knowledge_base is None:
         return None, 0
 
-    data = st.session_state.processed_data
-    
-    full_text = "\n\n--- FILE SEPARATOR ---\n\n".join(
-        f"Content from file '{path}':\n{content}"
-        for path, content in data.items()
-    )
-    return full_text, len(data)
+    if query is not None:
+        token_budget = DEFAULT_RETRIEVAL_TOKENS if token_budget is None else token_budget
+        chunk_ids = select_chunks(query, token_budget)
+        if not chunk_ids:
+            return knowledge_base.packed(token_budget), len(knowledge_base)
+    if chunk_ids is not None:
+        sections, num_files = _chunk_sections(chunk_ids)
+        return CURRICULUM_FILE_SEPARATOR.join(f"{header}\n{text}" for header, text in sections), num_files
+
+    return knowledge_base.full_text, len(knowledge_base)
+
+def material_token_budget(reserved_output_tokens, prompt_text=""):
+    """Returns the token budget left for materials next to a prompt, given the functional models' context windows."""
+    model_names = [context_model_name(name) for name in get_functional_models()]
+    return context_budget(model_names, reserved_output_tokens, prompt_text)
+
+def pack_curriculum_context(token_budget, chunk_ids=None, files=None):
+    """
+    Returns the session's materials packed into `token_budget` tokens: whole
+    files first, then whole paragraphs of the files that no longer fit. With
+    `chunk_ids`, only those chunks are packed, in the given order; with
+    `files`, only those files.
+    """
+    knowledge_base = get_knowledge_base()
+    if knowledge_base is None:
+        return None
+    data = knowledge_base.data
+    if chunk_ids is None and files is None:
+        return knowledge_base.packed(token_budget)
+    if chunk_ids is not None:
+        sections, _ = _chunk_sections(chunk_ids)
+    else:
+        sections = [
+            (f"Content from file '{path}':", data[path])
+            for path in files if path in data
+        ]
+    packed, _ = pack_sections(sections, token_budget, separator=CURRICULUM_FILE_SEPARATOR)
+    return packed
 
 def extract_text_from_file(uploaded_file):
     """
@@ -64,153 +301,844 @@ def extract_text_from_file(uploaded_file):
     
     file_name = uploaded_file.name
     ext = os.path.splitext(file_name)[1].lower()
-    text = ""
-    
+    if ext not in SUPPORTED_EXTENSIONS:
+        st.warning(f"File extension '{ext}' for '{file_name}' is not supported for direct extraction.")
+        return ""
+
     try:
-        uploaded_file.seek(0)
-        
-        if ext == ".pdf":
-            with pdfplumber.open(uploaded_file) as pdf:
-                for page in pdf.pages:
-                    page_text = page.extract_text()
-                    if page_text:
-                        text += page_text + "\n"
-        elif ext == ".docx":
-            doc = DocxDocument(uploaded_file)
-            for para in doc.paragraphs:
-                text += para.text + "\n"
-        elif ext == ".pptx":
-            prs = Presentation(uploaded_file)
-            for slide in prs.slides:
-                for shape in slide.shapes:
-                    if hasattr(shape, "text"):
-                        text += shape.text + "\n"
-        elif ext in [".txt", ".md"]:
-            text = uploaded_file.getvalue().decode("utf-8")
-        else:
-            st.warning(f"File extension '{ext}' for '{file_name}' is not supported for direct extraction.")
-            
+        return cached_extract_text(file_name, uploaded_file.getvalue(), get_extraction_cache())
     except Exception as e:
         st.error(f"An error occurred while reading the file '{file_name}': {e}")
+        return ""
+
+def extract_documents_from_files(uploaded_files, progress_callback=None, pdf_backend=None):
+    """
+    Extracts document records (text plus page/slide structure, see
+    data_extractor.extract_document) from several uploaded files in parallel
+    worker processes and returns {file name: document} in upload order.
+    PDFs are read with `pdf_backend` (see data_extractor.PDF_BACKENDS).
+    Re-uploaded files are served from the extraction cache; files that fail,
+    crash their worker or time out are reported and skipped.
+    """
+    items = []
+    for uploaded_file in uploaded_files:
+        ext = os.path.splitext(uploaded_file.name)[1].lower()
+        if ext in SUPPORTED_EXTENSIONS:
+            items.append((uploaded_file.name, uploaded_file.getvalue()))
+        else:
+            st.warning(f"File extension '{ext}' for '{uploaded_file.name}' is not supported for direct extraction.")
 
-    return text
+    documents, errors = extract_many(
+        items, progress_callback=progress_callback, cache=get_extraction_cache(), pdf_backend=pdf_backend
+    )
+    for file_name, reason in errors.items():
+        st.error(f"An error occurred while reading the file '{file_name}': {reason}")
+    return {name: document for name, document in documents.items() if document["text"]}
+
+def load_documents_into_session(documents, collapse_duplicates=True):
+    """
+    Makes the extracted documents the session's knowledge base, keeping their
+    structure for chunking. Near-duplicate files (the same lecture as PDF and
+    PPTX, revisions of a worksheet) are recorded in
+    session_state.duplicate_files as {duplicate: (kept, similarity)} and,
+    with `collapse_duplicates`, left out of processed_data.
+    """
+    texts = {name: document["text"] for name, document in documents.items()}
+    duplicates = find_near_duplicates(texts)
+    if collapse_duplicates:
+        documents = {name: document for name, document in documents.items() if name not in duplicates}
+    handle = get_shared_knowledge_bases().acquire(
+        {name: document["text"] for name, document in documents.items()},
+        {name: document_layout(document) for name, document in documents.items()}
+    )
+    # The session keeps views of the shared snapshot, not its own copies.
+    knowledge_base = handle.knowledge_base
+    st.session_state.processed_data = knowledge_base.data
+    st.session_state.document_layouts = knowledge_base.layouts
+    st.session_state['_knowledge_base'] = (knowledge_base.data, handle)
+    st.session_state.duplicate_files = duplicates
+    st.session_state.duplicates_collapsed = collapse_duplicates
+    get_search_index()  # index now, so the first question does not pay for it
+    start_dense_index()
+    return duplicates
 
 # --- AI Helper Functions ---
+# "g4f" talks to the live providers; "mock" uses the in-process fake from
+# mock_ai_provider (configured through MOCK_AI_CONFIG) for offline benchmarks.
+AI_PROVIDER = os.environ.get("EDU_AI_PROVIDER", "g4f")
+AI_PROVIDERS = {
+    "g4f": Client,
+    "mock": MockAIClient.from_env,
+}
+
 @st.cache_resource
 def init_ai_service_client():
-    """Initializes the AI client."""
+    """Initializes the AI client for the configured provider."""
     try:
-        client = Client()
+        client = AI_PROVIDERS[AI_PROVIDER]()
         return client
     except Exception as e:
         st.error(f"Critical error initializing AI client: {e}")
         return None
 
-@st.cache_resource
-def get_functional_models():
+# --- Model Health Probing ---
+# Probe results are persisted so a restarted server warm-starts from the last
+# known-good model list instead of re-testing every model inline.
+MODEL_HEALTH_FILE = os.path.join("output", f"model_health_{AI_PROVIDER}.json")
+MODEL_HEALTH_TTL_SECONDS = 6 * 60 * 60
+# Failures are often transient (a network blip), so they are trusted for much less long.
+MODEL_HEALTH_FAILED_TTL_SECONDS = 5 * 60
+MODEL_PROBE_TIMEOUT = 10
+MODEL_PROBE_MAX_WORKERS = 8
+MODEL_PROBE_PROMPT = "Scrie o singură propoziție despre un robot."
+PRIORITY_MODELS = ["DeepInfra", "LambdaChat", "OIVSCodeSer0501", "WeWordle", "Yqcloud"]
+
+_model_health = None
+_model_health_lock = threading.Lock()
+_background_probe_thread = None
+# Held for the whole of a cold-start probe, so concurrent first calls wait for it.
+_inline_probe_lock = threading.Lock()
+
+def _candidate_model_names():
+    """Returns the model names to probe, priority models first."""
+    client = init_ai_service_client()
+    if hasattr(client, "list_models"):
+        all_model_names = set(client.list_models())
+    else:
+        all_model_names = {name for name, _ in inspect.getmembers(g4f.models, inspect.isclass)}
+    candidates = [name for name in PRIORITY_MODELS if name in all_model_names]
+    candidates += sorted(
+        name for name in all_model_names
+        if name not in PRIORITY_MODELS and not name.startswith('_')
+    )
+    return candidates
+
+def context_model_name(name):
     """
-    Tests all available models to find which ones are functional.
-    This function is cached to run only once at the start.
+    Returns the model id behind a router name, for looking up its context
+    window: g4f model ids are kept, provider names (such as the
+    PRIORITY_MODELS) resolve to the provider's default model, and anything
+    else (g4f's model classes, mock models) is returned unchanged.
     """
-    functional_models = []
-    all_model_classes = inspect.getmembers(g4f.models, inspect.isclass)
-    test_prompt = "Scrie o singură propoziție despre un robot."
-    
-    # Prioritize the user's requested models for testing
-    priority_models = ["DeepInfra", "LambdaChat", "OIVSCodeSer0501", "WeWordle", "Yqcloud"]
-    
-    # Create a set of all model names to avoid re-testing
-    all_model_names = {name for name, _ in all_model_classes}
-    
-    # Test priority models first
-    for model_name in priority_models:
-        if model_name in all_model_names:
-            try:
-                print(f"Testing priority model: {model_name}")
-                response = g4f.ChatCompletion.create(
-                    model=model_name,
-                    messages=[{"role": "user", "content": test_prompt}],
-                    stream=False,
-                    timeout=10
-                )
-                if response:
-                    functional_models.append(model_name)
-            except Exception as e:
-                print(f"Model {model_name} failed: {e}")
-                
-    # Test the rest of the models
-    for name, model_class in all_model_classes:
-        if name not in priority_models and not name.startswith('_'):
+    if name in g4f.models.ModelUtils.convert:
+        return name
+    provider = getattr(g4f.Provider, name, None)
+    return getattr(provider, "default_model", None) or name
+
+def _load_model_health():
+    """Returns the in-memory health table, loading it from disk on first use."""
+    global _model_health
+    with _model_health_lock:
+        if _model_health is None:
             try:
-                print(f"Testing other model: {name}")
-                response = g4f.ChatCompletion.create(
-                    model=name,
-                    messages=[{"role": "user", "content": test_prompt}],
-                    stream=False,
-                    timeout=10
-                )
-                if response:
-                    functional_models.append(name)
-            except Exception as e:
-                print(f"Model {name} failed: {e}")
-    
+                with open(MODEL_HEALTH_FILE, "r", encoding="utf-8") as f:
+                    _model_health = json.load(f)
+            except (OSError, ValueError):
+                _model_health = {}
+        return dict(_model_health)
+
+def _save_model_health():
+    """Writes the health table atomically so concurrent readers never see a partial file."""
+    with _model_health_lock:
+        snapshot = dict(_model_health or {})
+    try:
+        write_atomic(MODEL_HEALTH_FILE, json.dumps(snapshot, ensure_ascii=False, indent=2))
+    except OSError as e:
+        print(f"Could not save model health file: {e}")
+
+def _probe_model(model_name):
+    """Sends a tiny test prompt to a model and returns its health entry."""
+    started = time.monotonic()
+    ok = False
+    try:
+        print(f"Testing model: {model_name}")
+        response = init_ai_service_client().chat.completions.create(
+            model=model_name,
+            messages=[{"role": "user", "content": MODEL_PROBE_PROMPT}],
+            stream=False,
+            timeout=MODEL_PROBE_TIMEOUT
+        )
+        ok = bool(_response_content(response))
+    except Exception as e:
+        print(f"Model {model_name} failed: {e}")
+    return {"ok": ok, "latency": round(time.monotonic() - started, 3), "checked_at": time.time()}
+
+def _probe_models(model_names):
+    """Probes the given models concurrently with a bounded worker pool and persists the results."""
+    global _model_health
+    if not model_names:
+        return
+    with ThreadPoolExecutor(max_workers=MODEL_PROBE_MAX_WORKERS) as executor:
+        futures = {executor.submit(_probe_model, name): name for name in model_names}
+        for future in as_completed(futures):
+            entry = future.result()
+            with _model_health_lock:
+                if _model_health is None:
+                    _model_health = {}
+                _model_health[futures[future]] = entry
+    _save_model_health()
+
+def _probe_models_in_background(model_names):
+    """Starts a single background re-probe; does nothing if one is already running."""
+    global _background_probe_thread
+    with _model_health_lock:
+        if _background_probe_thread is not None and _background_probe_thread.is_alive():
+            return
+        _background_probe_thread = threading.Thread(
+            target=_probe_models, args=(list(model_names),), daemon=True, name="model-health-probe"
+        )
+        _background_probe_thread.start()
+
+def _stale_models(candidates, health):
+    """
+    Returns the candidates with no health entry or an expired one: working
+    models expire after MODEL_HEALTH_TTL_SECONDS, failed ones after
+    MODEL_HEALTH_FAILED_TTL_SECONDS.
+    """
+    now = time.time()
+    stale = []
+    for name in candidates:
+        entry = health.get(name)
+        ttl = MODEL_HEALTH_TTL_SECONDS if entry and entry.get("ok") else MODEL_HEALTH_FAILED_TTL_SECONDS
+        if entry is None or now - entry.get("checked_at", 0) > ttl:
+            stale.append(name)
+    return stale
+
+def _probe_cold_start(candidates):
+    """
+    Probes the stale candidates inline and returns the functional ones.
+    Single-flight: callers arriving while a probe runs wait for it and use
+    its results instead of probing again.
+    """
+    with _inline_probe_lock:
+        health = _load_model_health()
+        if not any(health.get(name, {}).get("ok") for name in candidates):
+            _probe_models(_stale_models(candidates, health))
+            health = _load_model_health()
+    return [name for name in candidates if health.get(name, {}).get("ok")]
+
+def get_functional_models():
+    """
+    Returns the models known to be functional, priority models first.
+    Results come from the persisted health file; stale or unknown models are
+    re-probed in the background. Only a cold start with no usable entries
+    probes inline, and then all models are tested concurrently.
+    """
+    candidates = _candidate_model_names()
+    health = _load_model_health()
+
+    stale = _stale_models(candidates, health)
+    functional_models = [name for name in candidates if health.get(name, {}).get("ok")]
+
+    if not functional_models and stale:
+        functional_models = _probe_cold_start(candidates)
+    elif stale:
+        _probe_models_in_background(stale)
+
     if not functional_models:
         st.error("No functional AI models were found. Please try again later.")
-        
+
     return functional_models
 
-def process_direct_with_ai_service(user_input_text, system_prompt, ai_client_instance, generation_params=None):
+# --- AI Request Routing ---
+AI_REQUEST_TIMEOUT = 180
+HEDGE_FANOUT = 3
+HEDGE_DELAY_SECONDS = 2.0
+AI_BATCH_MAX_CONCURRENCY = 4
+# Total time one call may spend across all of its fallback attempts.
+AI_CALL_DEADLINE_SECONDS = 300
+AI_MIN_ATTEMPT_SECONDS = 5
+AI_UI_POLL_SECONDS = 0.5
+AI_CANCELLED_MESSAGE = "Error: the AI request was cancelled."
+AI_DEADLINE_MESSAGE = "Error: the AI request ran out of time."
+AI_NO_MODEL_MESSAGE = "Nu a fost găsit niciun model funcțional."
+
+AI_METRICS_JSON_PATH = os.path.join("output", "ai_metrics.json")
+AI_METRICS_PROMETHEUS_PATH = os.path.join("output", "ai_metrics.prom")
+
+AI_CACHE_ENABLED = os.environ.get("EDU_AI_CACHE", "on") != "off"
+AI_CACHE_PATH = os.path.join("output", f"ai_response_cache_{AI_PROVIDER}.sqlite3")
+AI_CACHE_TTL_SECONDS = 7 * 24 * 3600
+AI_CACHE_MEMORY_ENTRIES = 256
+AI_CACHE_MAX_DISK_BYTES = 200 * 1024 * 1024
+
+# Whole calls started with submit_ai_request.
+_BACKGROUND_AI_EXECUTOR = ThreadPoolExecutor(max_workers=4, thread_name_prefix="ai-background")
+
+# The singletons below are also first reached from worker threads, where the
+# cache-miss spinner cannot be drawn, so it is turned off.
+
+@st.cache_resource(show_spinner=False)
+def get_model_router():
+    """Returns the process-wide model router, shared by every session."""
+    return ModelRouter()
+
+@st.cache_resource(show_spinner=False)
+def get_telemetry():
+    """Returns the process-wide AI call telemetry collector."""
+    return telemetry.AITelemetry(json_path=AI_METRICS_JSON_PATH, prometheus_path=AI_METRICS_PROMETHEUS_PATH)
+
+@st.cache_resource(show_spinner=False)
+def get_response_cache():
+    """Returns the process-wide AI response cache, or None if it is disabled or cannot be opened."""
+    if not AI_CACHE_ENABLED:
+        return None
+    try:
+        return ResponseCache(
+            AI_CACHE_PATH,
+            ttl_seconds=AI_CACHE_TTL_SECONDS,
+            memory_entries=AI_CACHE_MEMORY_ENTRIES,
+            max_disk_bytes=AI_CACHE_MAX_DISK_BYTES
+        )
+    except Exception as e:
+        print(f"AI response cache disabled: {e}")
+        return None
+
+def _build_messages(user_input_text, system_prompt, params):
+    """Builds the chat messages for a request, consuming 'messages_override' from params."""
+    if "messages_override" in params:
+        return params.pop("messages_override")
+    messages_to_send = []
+    if system_prompt:
+        messages_to_send.append({"role": "system", "content": system_prompt})
+    if user_input_text:
+        messages_to_send.append({"role": "user", "content": user_input_text})
+    return messages_to_send
+
+def _response_content(response):
+    """Returns the text of a completion, or None if the response carries no content."""
+    if response and response.choices and response.choices[0].message and response.choices[0].message.content:
+        return response.choices[0].message.content
+    return None
+
+class AIFailure(str):
+    """
+    A reply that reports why no completion was produced. It is still the
+    message string, so pages that show replies as they are keep working;
+    callers that store or build on a reply check is_ai_failure() instead.
+    """
+
+def is_ai_failure(reply):
+    """True if `reply` is not a completion (empty, or an AIFailure)."""
+    return not reply or isinstance(reply, AIFailure)
+
+class StreamedReply:
+    """
+    Wraps a stream of text deltas for st.write_stream and remembers whether
+    it ended in an AIFailure, which st.write_stream returns as plain text.
+    """
+
+    def __init__(self, deltas):
+        self.deltas = deltas
+        self.failed = False
+
+    def __iter__(self):
+        for delta in self.deltas:
+            if isinstance(delta, AIFailure):
+                self.failed = True
+            yield delta
+
+def _is_cancelled(cancel_event):
+    return cancel_event is not None and cancel_event.is_set()
+
+def _budget_exhausted(deadline_at):
+    return deadline_at - time.monotonic() < AI_MIN_ATTEMPT_SECONDS
+
+def _stop_message(deadline_at, cancel_event):
+    """Returns the reason a call stopped early, or None if it simply ran out of models."""
+    if _is_cancelled(cancel_event):
+        return AI_CANCELLED_MESSAGE
+    if _budget_exhausted(deadline_at):
+        return AI_DEADLINE_MESSAGE
+    return None
+
+def _attempt_timeout(router, model_name, deadline_at, attempts_left):
+    """
+    Returns the timeout for one attempt: the router's estimate for the model,
+    capped so that, while other candidates remain, half of the remaining
+    budget is kept for them.
+    """
+    remaining = deadline_at - time.monotonic()
+    share = remaining if attempts_left <= 1 else remaining / 2
+    return max(AI_MIN_ATTEMPT_SECONDS, min(router.timeout_for(model_name, AI_REQUEST_TIMEOUT), share))
+
+def _attempt_completion(ai_client_instance, model_name, messages_to_send, params, router, timeout, stop_event=None):
+    """
+    Runs one completion against one model, records the outcome, and returns
+    the text or None. Nothing is sent if `stop_event` is already set.
+    """
+    if _is_cancelled(stop_event):
+        return None
+    started = time.monotonic()
+    try:
+        print(f"Încercăm modelul: {model_name}")
+        response = ai_client_instance.chat.completions.create(
+            messages=messages_to_send,
+            stream=False,
+            timeout=timeout,
+            **dict(params, model=model_name)
+        )
+    except Exception as e:
+        print(f"Eroare cu modelul {model_name}: {e}")
+        router.record_failure(model_name, time.monotonic() - started, kind="error")
+        return None
+
+    content = _response_content(response)
+    if content:
+        router.record_success(model_name, time.monotonic() - started)
+        return content.strip()
+    router.record_failure(model_name, time.monotonic() - started, kind="empty")
+    return None
+
+def _start_attempt(fn, *args):
+    """
+    Runs fn(*args) on its own daemon thread and returns a Future for it.
+    Hedged attempts are not pooled: a losing attempt still blocked in a
+    provider call holds only its own thread until its timeout, never a
+    worker that a new call would have to queue behind.
+    """
+    future = Future()
+
+    def run():
+        if not future.set_running_or_notify_cancel():
+            return
+        try:
+            future.set_result(fn(*args))
+        except BaseException as e:
+            future.set_exception(e)
+
+    threading.Thread(target=run, name="ai-attempt", daemon=True).start()
+    return future
+
+def _run_hedged(model_names, attempt, deadline_at, cancel_event=None, discard=None):
+    """
+    Races up to HEDGE_FANOUT models: the next model is started whenever the
+    in-flight ones have not answered within HEDGE_DELAY_SECONDS, or as soon as
+    one of them fails. `attempt(model_name, stop_event)` returns a result or
+    None; the first truthy result wins and is returned as (model_name, result,
+    attempts), where `attempts` counts the models started. No new model is
+    started once the call is cancelled or its deadline has passed.
+    When the race ends, `stop_event` is set so losing attempts stop as soon
+    as they can, and `discard(result)` is called with any result a loser
+    still produces (e.g. to close a stream).
+    """
+    candidates = iter(model_names)
+    pending = {}
+    attempts = 0
+    race_over = threading.Event()
+
+    def launch_next():
+        nonlocal attempts
+        if _is_cancelled(cancel_event) or _budget_exhausted(deadline_at):
+            return
+        model_name = next(candidates, None)
+        if model_name is not None:
+            pending[_start_attempt(attempt, model_name, race_over)] = model_name
+            attempts += 1
+
+    def discard_loser(future):
+        if future.cancelled() or future.exception() is not None:
+            return
+        result = future.result()
+        if result and discard is not None:
+            discard(result)
+
+    try:
+        launch_next()
+        while pending:
+            remaining = deadline_at - time.monotonic()
+            if remaining <= 0 or _is_cancelled(cancel_event):
+                break
+            done, _ = wait(pending, timeout=min(HEDGE_DELAY_SECONDS, remaining), return_when=FIRST_COMPLETED)
+            for future in done:
+                model_name = pending.pop(future)
+                result = future.result()
+                if result:
+                    return model_name, result, attempts
+            for _ in range(max(len(done), 1)):
+                if len(pending) < HEDGE_FANOUT:
+                    launch_next()
+        return None, None, attempts
+    finally:
+        race_over.set()
+        for future in pending:
+            future.cancel()
+            future.add_done_callback(discard_loser)
+
+def _record_ai_call(call_started, messages_to_send, outcome, model_name=None, attempts=0, completion="",
+                    cache_hit=False, streamed=False):
+    """Reports one finished AI call to the telemetry collector."""
+    collector = get_telemetry()
+    if collector is None:
+        return
+    submitted = telemetry.queued_at.get()
+    now = time.monotonic()
+    collector.record(
+        page=telemetry.current_page.get(),
+        model=model_name,
+        outcome=outcome,
+        wall_time=now - (submitted if submitted is not None else call_started),
+        queue_time=call_started - submitted if submitted is not None else 0.0,
+        attempts=attempts,
+        prompt_tokens=sum(estimate_tokens(str(m.get("content", ""))) for m in messages_to_send),
+        completion_tokens=estimate_tokens(completion),
+        cache_hit=cache_hit,
+        streamed=streamed
+    )
+
+def _stop_outcome(deadline_at, cancel_event):
+    if _is_cancelled(cancel_event):
+        return "cancelled"
+    if _budget_exhausted(deadline_at):
+        return "deadline"
+    return "error"
+
+def process_direct_with_ai_service(user_input_text, system_prompt, ai_client_instance, generation_params=None, hedge=False, use_cache=True,
+                                   deadline=AI_CALL_DEADLINE_SECONDS, cancel_event=None):
     """
     Sends a request to the AI service and returns the response.
-    It now automatically tries a list of models until it finds a working one.
+    Models are tried in the order chosen by the model router (fastest expected
+    first); models whose circuit breaker is open are skipped. With `hedge=True`
+    the fastest models are raced against each other, trading provider quota for
+    lower tail latency on interactive pages.
+    Identical requests are answered from the response cache; pass
+    `use_cache=False` when a fresh generation is wanted on every call.
+    The whole call, fallbacks included, is bounded by `deadline` seconds, and
+    setting `cancel_event` (a threading.Event) stops it before the next attempt.
     """
+    call_started = time.monotonic()
+    deadline_at = call_started + deadline
     params = generation_params.copy() if generation_params else {}
-    
-    if "messages_override" in params:
-        messages_to_send = params.pop("messages_override")
-    else:
-        messages_to_send = []
-        if system_prompt:
-            messages_to_send.append({"role": "system", "content": system_prompt})
-        if user_input_text:
-            messages_to_send.append({"role": "user", "content": user_input_text})
+    messages_to_send = _build_messages(user_input_text, system_prompt, params)
 
     if not messages_to_send:
-        return "Internal Error: No input provided for AI."
+        return AIFailure("Internal Error: No input provided for AI.")
     
     if ai_client_instance is None:
-        return "AI Service is unavailable."
+        return AIFailure("AI Service is unavailable.")
 
-    available_models_to_try = get_functional_models()
-    
+    cache = get_response_cache() if use_cache else None
+    cache_key = make_cache_key(messages_to_send, params)
+    if cache is not None:
+        cached = cache.get(cache_key)
+        if cached is not None:
+            _record_ai_call(call_started, messages_to_send, "ok", completion=cached, cache_hit=True)
+            return cached
+
+    router = get_model_router()
+    models_to_try = router.order(get_functional_models())
+
+    content = None
     used_model = None
-    response = None
+    attempts = 0
+    if hedge:
+        used_model, content, attempts = _run_hedged(
+            models_to_try,
+            lambda model_name, stop_event: _attempt_completion(
+                ai_client_instance, model_name, messages_to_send, params, router,
+                _attempt_timeout(router, model_name, deadline_at, 1), stop_event
+            ),
+            deadline_at, cancel_event
+        )
+    else:
+        for position, model_name in enumerate(models_to_try):
+            if _is_cancelled(cancel_event) or _budget_exhausted(deadline_at):
+                break
+            timeout = _attempt_timeout(router, model_name, deadline_at, len(models_to_try) - position)
+            attempts += 1
+            content = _attempt_completion(ai_client_instance, model_name, messages_to_send, params, router, timeout)
+            if content:
+                used_model = model_name
+                break
+
+    if content:
+        if cache is not None:
+            cache.set(cache_key, content)
+        _record_ai_call(call_started, messages_to_send, "ok", used_model, attempts, content)
+        return content
 
-    for model_name in available_models_to_try:
-        params['model'] = model_name
+    _record_ai_call(call_started, messages_to_send, _stop_outcome(deadline_at, cancel_event), attempts=attempts)
+    return AIFailure(_stop_message(deadline_at, cancel_event) or AI_NO_MODEL_MESSAGE)
+
+def process_many_with_ai_service(requests, ai_client_instance, max_concurrency=AI_BATCH_MAX_CONCURRENCY, progress_callback=None, cancel_event=None):
+    """
+    Runs several independent AI requests concurrently and returns their
+    responses in the same order as `requests`. Each request is a dict of
+    keyword arguments for process_direct_with_ai_service (user_input_text,
+    system_prompt, generation_params, ...), so every request gets its own
+    model fallback and caching. `progress_callback(completed, total)` is
+    called from the calling thread, so it can safely update st.progress.
+    If the caller is interrupted (e.g. a Streamlit rerun raised from the
+    progress callback) or `cancel_event` is set, queued requests are dropped
+    and running ones stop before their next model attempt.
+    """
+    requests = list(requests)
+    results = [None] * len(requests)
+    if not requests:
+        return results
+
+    cancel_event = cancel_event or threading.Event()
+    executor = ThreadPoolExecutor(max_workers=max(1, max_concurrency), thread_name_prefix="ai-batch")
+    try:
+        futures = {
+            telemetry.submit_with_context(
+                executor,
+                process_direct_with_ai_service,
+                request.get("user_input_text"),
+                request.get("system_prompt"),
+                ai_client_instance,
+                cancel_event=cancel_event,
+                **{k: v for k, v in request.items() if k not in ("user_input_text", "system_prompt")}
+            ): index
+            for index, request in enumerate(requests)
+        }
+        for completed, future in enumerate(as_completed(futures), start=1):
+            index = futures[future]
+            try:
+                results[index] = future.result()
+            except Exception as e:
+                print(f"Batch AI request {index} failed: {e}")
+                results[index] = AIFailure(f"Error: {e}")
+            if progress_callback:
+                progress_callback(completed, len(requests))
+    except BaseException:
+        cancel_event.set()
+        raise
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+    return results
+
+def submit_ai_request(user_input_text, system_prompt, ai_client_instance, generation_params=None, **kwargs):
+    """
+    Starts process_direct_with_ai_service off the script thread and returns
+    its Future, for work the page does not wait on (its result is picked up
+    on a later rerun). Keyword arguments are passed through.
+    """
+    return telemetry.submit_with_context(
+        _BACKGROUND_AI_EXECUTOR, process_direct_with_ai_service,
+        user_input_text, system_prompt, ai_client_instance, generation_params, **kwargs
+    )
+
+def run_cancellable(label, fn, *args, **kwargs):
+    """
+    Runs a blocking AI call such as process_direct_with_ai_service on a worker
+    thread while showing `label`, the elapsed time and a Cancel button.
+    Clicking Cancel (or navigating to another page) makes Streamlit rerun the
+    script; the status updates below are where that rerun interrupts this
+    function, and the call's cancel_event is then set so it stops trying
+    further models instead of running on in the background.
+    """
+    cancel_event = threading.Event()
+    placeholder = st.empty()
+    with placeholder.container():
+        status = st.empty()
+        st.button("✖️ Cancel", key=f"cancel_{label}", on_click=lambda: st.toast("AI request cancelled."))
+
+    executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="ai-call")
+    future = telemetry.submit_with_context(executor, fn, *args, cancel_event=cancel_event, **kwargs)
+    started = time.monotonic()
+    try:
+        while True:
+            try:
+                return future.result(timeout=AI_UI_POLL_SECONDS)
+            except FuturesTimeoutError:
+                status.info(f"⏳ {label} ({time.monotonic() - started:.0f}s)")
+    finally:
+        cancel_event.set()
+        executor.shutdown(wait=False)
+        placeholder.empty()
+
+def _chunk_content(chunk):
+    """Returns the text delta carried by a streaming chunk, or None."""
+    if chunk and getattr(chunk, "choices", None) and chunk.choices[0].delta and chunk.choices[0].delta.content:
+        return chunk.choices[0].delta.content
+    return None
+
+def _close_stream(chunks):
+    """Closes a provider stream, releasing its connection."""
+    if hasattr(chunks, "close"):
+        chunks.close()
+
+def _open_stream(ai_client_instance, model_name, messages_to_send, params, router, timeout, stop_event=None):
+    """
+    Starts a streaming completion and waits for its first non-empty delta.
+    Returns (first_delta, chunk_iterator, started) or None if the model failed
+    before producing any text, in which case the failure is recorded. Setting
+    `stop_event` abandons the attempt (and closes its stream) at the next chunk.
+    """
+    if _is_cancelled(stop_event):
+        return None
+    started = time.monotonic()
+    try:
+        print(f"Încercăm modelul (stream): {model_name}")
+        chunks = iter(ai_client_instance.chat.completions.create(
+            messages=messages_to_send,
+            stream=True,
+            timeout=timeout,
+            **dict(params, model=model_name)
+        ))
+        for chunk in chunks:
+            if _is_cancelled(stop_event):
+                _close_stream(chunks)
+                return None
+            delta = _chunk_content(chunk)
+            if delta:
+                return delta, chunks, started
+    except Exception as e:
+        print(f"Eroare cu modelul {model_name}: {e}")
+        router.record_failure(model_name, time.monotonic() - started, kind="error")
+        return None
+    router.record_failure(model_name, time.monotonic() - started, kind="empty")
+    return None
+
+def stream_direct_with_ai_service(user_input_text, system_prompt, ai_client_instance, generation_params=None, hedge=False, use_cache=True,
+                                  deadline=AI_CALL_DEADLINE_SECONDS, cancel_event=None):
+    """
+    Streaming counterpart of process_direct_with_ai_service: a generator of
+    text deltas suitable for st.write_stream. When no model answers, the only
+    delta is an AIFailure; wrap the generator in StreamedReply to tell. Models are tried in router order
+    and the next one is used only while no token has arrived yet; once a model
+    starts answering, its stream is followed to the end. With `hedge=True` the
+    fastest models race for the first token. The deadline and cancel_event
+    also end a stream midway, and the provider stream is closed whenever the
+    consumer stops reading (e.g. the page was rerun).
+    """
+    call_started = time.monotonic()
+    deadline_at = call_started + deadline
+    params = generation_params.copy() if generation_params else {}
+    messages_to_send = _build_messages(user_input_text, system_prompt, params)
+
+    if not messages_to_send:
+        yield AIFailure("Internal Error: No input provided for AI.")
+        return
+
+    if ai_client_instance is None:
+        yield AIFailure("AI Service is unavailable.")
+        return
+
+    cache = get_response_cache() if use_cache else None
+    cache_key = make_cache_key(messages_to_send, params)
+    if cache is not None:
+        cached = cache.get(cache_key)
+        if cached is not None:
+            _record_ai_call(call_started, messages_to_send, "ok", completion=cached, cache_hit=True, streamed=True)
+            yield cached
+            return
+
+    router = get_model_router()
+    models_to_try = router.order(get_functional_models())
+
+    def attempt(model_name, attempts_left=1, stop_event=None):
+        timeout = _attempt_timeout(router, model_name, deadline_at, attempts_left)
+        return _open_stream(ai_client_instance, model_name, messages_to_send, params, router, timeout, stop_event)
+
+    model_name, opened, attempts = None, None, 0
+    if hedge:
+        model_name, opened, attempts = _run_hedged(
+            models_to_try,
+            lambda candidate, stop_event: attempt(candidate, stop_event=stop_event),
+            deadline_at, cancel_event, discard=lambda opened: _close_stream(opened[1])
+        )
+    else:
+        for position, candidate in enumerate(models_to_try):
+            if _is_cancelled(cancel_event) or _budget_exhausted(deadline_at):
+                break
+            attempts += 1
+            opened = attempt(candidate, len(models_to_try) - position)
+            if opened:
+                model_name = candidate
+                break
+
+    if not opened:
+        _record_ai_call(call_started, messages_to_send, _stop_outcome(deadline_at, cancel_event), attempts=attempts, streamed=True)
+        yield AIFailure(_stop_message(deadline_at, cancel_event) or AI_NO_MODEL_MESSAGE)
+        return
+
+    first_delta, chunks, started = opened
+    pieces = [first_delta]
+    # Stays "cancelled" if the consumer stops reading (GeneratorExit) before the end.
+    outcome = "cancelled"
+    try:
+        yield first_delta
+        for chunk in chunks:
+            if _is_cancelled(cancel_event) or time.monotonic() > deadline_at:
+                print(f"Stream stopped early for model {model_name}.")
+                outcome = _stop_outcome(deadline_at, cancel_event)
+                return
+            delta = _chunk_content(chunk)
+            if delta:
+                pieces.append(delta)
+                yield delta
+        outcome = "ok"
+    except Exception as e:
+        # Text has already been shown to the user, so there is nothing to fall back to.
+        print(f"Stream interrupted for model {model_name}: {e}")
+        router.record_failure(model_name, time.monotonic() - started, kind="error")
+        outcome = "error"
+        return
+    finally:
+        _close_stream(chunks)
+        _record_ai_call(call_started, messages_to_send, outcome, model_name, attempts, "".join(pieces), streamed=True)
+
+    router.record_success(model_name, time.monotonic() - started)
+    if cache is not None:
+        cache.set(cache_key, "".join(pieces).strip())
+
+def stream_cancellable(label, fn, *args, **kwargs):
+    """
+    Streaming counterpart of run_cancellable: runs a delta generator such as
+    stream_direct_with_ai_service on a worker thread and returns a
+    StreamedReply over it for st.write_stream. Until the first delta arrives,
+    `label` and the elapsed time are shown and refreshed every
+    AI_UI_POLL_SECONDS; those updates are where a click on the page's Cancel
+    button (a rerun) interrupts the wait. However reading stops, the call's
+    cancel_event is then set, so the worker stops and closes the provider
+    stream.
+    """
+    cancel_event = threading.Event()
+    deltas = queue.Queue()
+    finished = object()
+
+    def produce():
+        stream = fn(*args, cancel_event=cancel_event, **kwargs)
         try:
-            print(f"Încercăm modelul: {model_name}")
-            response = ai_client_instance.chat.completions.create(
-                messages=messages_to_send,
-                stream=False,
-                timeout=180,
-                **params
-            )
-            if response.choices and response.choices[0].message and response.choices[0].message.content:
-                used_model = model_name
-                break # Ieșim din buclă dacă am găsit un răspuns valid
+            for delta in stream:
+                deltas.put(delta)
+                if cancel_event.is_set():
+                    break
         except Exception as e:
-            print(f"Eroare cu modelul {model_name}: {e}")
-            continue
+            print(f"Stream '{label}' failed: {e}")
+        finally:
+            stream.close()
+            deltas.put(finished)
 
-    if not used_model:
-        return "Nu a fost găsit niciun model funcțional."
+    status = st.empty()
+    executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="ai-stream")
+    telemetry.submit_with_context(executor, produce)
+    executor.shutdown(wait=False)
 
-    if response.choices and response.choices[0].message and response.choices[0].message.content:
-        return response.choices[0].message.content.strip()
-    
-    st.warning(f"Unexpected AI response structure: {response}")
-    return "The AI service did not return valid content."
+    def read():
+        started = time.monotonic()
+        waiting = True
+        try:
+            while True:
+                try:
+                    delta = deltas.get(timeout=AI_UI_POLL_SECONDS)
+                except queue.Empty:
+                    if waiting:
+                        status.info(f"⏳ {label} ({time.monotonic() - started:.0f}s)")
+                    continue
+                if delta is finished:
+                    return
+                if waiting:
+                    waiting = False
+                    status.empty()
+                yield delta
+        finally:
+            cancel_event.set()
+            status.empty()
+
+    return StreamedReply(read())
 
 # --- Formatting and Document Generation Helper Functions ---
 